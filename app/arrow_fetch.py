@@ -0,0 +1,146 @@
+"""Arrow fetch path for query_df: Postgres COPY output decoded by pyarrow.
+
+``pd.read_sql`` over psycopg2 builds a Python object for every cell. With
+``DASHBOARD_ARROW_FETCH=1`` on Postgres, ``query_df`` instead streams the result
+as ``COPY (query) TO STDOUT`` CSV through a pipe. pyarrow's streaming C++ reader
+decodes it block by block, using column types taken from the query's result
+description. The frame is then compacted: categorical country/segment and the
+narrowest integer dtypes.
+
+The frames are not identical to ``read_sql``'s. Missing values in text columns
+come back as NaN where ``read_sql`` may give None (always for the categorical
+columns, and for plain text on pandas < 3), so callers test them with
+``pd.isna`` rather than ``is None``.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import csv
+from sqlalchemy import text
+
+# Low-cardinality dimension columns returned as pandas categoricals
+CATEGORICAL_COLUMNS = ("country", "segment")
+# Column type lookups cached per SQL text (the result shape never depends on parameters)
+COLUMN_TYPES_CACHE_SIZE = 256
+NULL_MARKER = r"\N"
+
+# Postgres type OID -> Arrow type. NUMERIC becomes float64 like read_sql(coerce_float=True).
+# Anything not listed is read as text.
+PG_ARROW_TYPES = {
+    16: pa.bool_(),  # bool
+    20: pa.int64(),  # int8
+    21: pa.int64(),  # int2
+    23: pa.int64(),  # int4
+    700: pa.float64(),  # float4
+    701: pa.float64(),  # float8
+    1700: pa.float64(),  # numeric
+    1082: pa.date32(),  # date
+    1114: pa.timestamp("us"),  # timestamp
+    1184: pa.timestamp("us", tz="UTC"),  # timestamptz
+}
+
+_column_types: OrderedDict[str, list[tuple[str, pa.DataType]]] = OrderedDict()
+
+
+def arrow_fetch_enabled(connection) -> bool:
+    return (
+        os.getenv("DASHBOARD_ARROW_FETCH", "0") == "1"
+        and connection.dialect.name == "postgresql"
+    )
+
+
+def _bound_sql(connection, cursor, sql: str, params: dict | None) -> str:
+    """Inline ``params`` into ``sql`` with psycopg2's quoting (COPY takes no bind parameters)."""
+    compiled = text(sql).bindparams(**(params or {})).compile(dialect=connection.dialect)
+    return cursor.mogrify(str(compiled), compiled.params).decode()
+
+
+def _result_columns(cursor, sql: str, bound_sql: str) -> list[tuple[str, pa.DataType]]:
+    columns = _column_types.get(sql)
+    if columns is None:
+        cursor.execute(f"SELECT * FROM ({bound_sql}) AS q LIMIT 0")
+        columns = [
+            (column.name, PG_ARROW_TYPES.get(column.type_code, pa.string()))
+            for column in cursor.description
+        ]
+        _column_types[sql] = columns
+        while len(_column_types) > COLUMN_TYPES_CACHE_SIZE:
+            _column_types.popitem(last=False)
+    return columns
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Use categoricals for dimension columns and the narrowest lossless integer dtypes."""
+    for column in df.columns:
+        if column in CATEGORICAL_COLUMNS:
+            df[column] = df[column].astype("category")
+        elif pd.api.types.is_integer_dtype(df[column]) and not pd.api.types.is_bool_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], downcast="integer")
+    return df
+
+
+def _copy_to_pipe(cursor, copy_sql: str, write_fd: int, errors: list[BaseException]) -> None:
+    try:
+        with open(write_fd, "wb") as sink:
+            cursor.copy_expert(copy_sql, sink)
+    except BaseException as e:  # re-raised by read_sql_arrow on the calling thread
+        errors.append(e)
+
+
+def read_sql_arrow(connection, sql: str, params: dict | None = None) -> pd.DataFrame:
+    """Run ``sql`` on a SQLAlchemy Postgres ``connection`` and return a compacted DataFrame.
+
+    COPY writes into a pipe from a helper thread while pyarrow's streaming CSV
+    reader decodes from the other end, so the raw CSV is never held in memory.
+    If anything fails, ``connection`` is invalidated rather than returned to the pool.
+    """
+    cursor = connection.connection.cursor()
+    try:
+        bound_sql = _bound_sql(connection, cursor, sql, params)
+        columns = _result_columns(cursor, sql, bound_sql)
+        copy_sql = f"COPY ({bound_sql}) TO STDOUT WITH (FORMAT csv, HEADER false, NULL '{NULL_MARKER}')"
+
+        read_fd, write_fd = os.pipe()
+        errors: list[BaseException] = []
+        writer = threading.Thread(
+            target=_copy_to_pipe, args=(cursor, copy_sql, write_fd, errors), daemon=True
+        )
+        writer.start()
+        try:
+            with open(read_fd, "rb") as source:
+                if not source.peek(1):
+                    table = None
+                else:
+                    table = csv.open_csv(
+                        source,
+                        read_options=csv.ReadOptions(column_names=[name for name, _ in columns]),
+                        convert_options=csv.ConvertOptions(
+                            column_types=dict(columns),
+                            null_values=[NULL_MARKER],
+                            strings_can_be_null=True,
+                            quoted_strings_can_be_null=False,
+                            true_values=["t"],
+                            false_values=["f"],
+                        ),
+                    ).read_all()
+        finally:
+            # The read end is closed by now, so a writer stuck on a failed decode gets EPIPE
+            writer.join()
+        if errors:
+            raise errors[0]
+    except BaseException:
+        # A COPY abandoned part way leaves the DBAPI connection mid-protocol, so discard it
+        cursor.close()
+        connection.invalidate()
+        raise
+    else:
+        cursor.close()
+
+    if table is None:
+        table = pa.table({name: pa.array([], type=arrow_type) for name, arrow_type in columns})
+    return compact_frame(table.to_pandas())
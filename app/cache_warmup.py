@@ -0,0 +1,188 @@
+"""Optional cache warm-up that replays the dashboard's most frequent queries.
+
+The warm-up file is shared between processes only when DASHBOARD_WARMUP_KEY is
+set. Saved entries are signed with an HMAC of their SQL and parameters under
+that key, and entries without a valid signature are ignored, so whoever can
+write the file cannot make the dashboard run SQL it did not issue itself.
+Without a key, the counts stay in the process and no file is read or written.
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable
+
+import streamlit as st
+
+WARMUP_THREAD_NAME = "cache-warmup"
+DEFAULT_WARMUP_FILE = Path(__file__).resolve().parent.parent / "data" / "cache" / "warmup_queries.json"
+# Queries replayed per warm-up, most frequent first
+WARMUP_QUERIES = 25
+# Minimum seconds between rewrites of the warm-up file
+SAVE_INTERVAL_SECONDS = 60
+
+logger = logging.getLogger("dashboard.warmup")
+
+
+def warmup_enabled() -> bool:
+    return os.getenv("DASHBOARD_WARMUP", "0") == "1"
+
+
+def _warmup_file() -> Path:
+    return Path(os.getenv("DASHBOARD_WARMUP_FILE", DEFAULT_WARMUP_FILE))
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict) and "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    if isinstance(value, dict) and "__date__" in value:
+        return date.fromisoformat(value["__date__"])
+    return value
+
+
+def _query_key(sql: str, params: dict | None) -> tuple[str, str]:
+    return sql, json.dumps(params or {}, default=str, sort_keys=True)
+
+
+def _signing_key() -> bytes | None:
+    """DASHBOARD_WARMUP_KEY, which is required to save or replay the shared warm-up file."""
+    key = os.getenv("DASHBOARD_WARMUP_KEY")
+    return key.encode() if key else None
+
+
+def _signature(key: bytes, sql: str, params: dict | None) -> str:
+    payload = json.dumps(_query_key(sql, params))
+    return hmac.new(key, payload.encode(), hashlib.sha256).hexdigest()
+
+
+def _hot_entries(state: dict) -> list[dict]:
+    """The most frequent queries in ``state`` with their counts. Call with the lock held."""
+    return [
+        {**state["queries"][key], "count": count}
+        for key, count in state["counts"].most_common(WARMUP_QUERIES)
+    ]
+
+
+@st.cache_resource
+def _query_counts() -> dict:
+    """Process-wide usage counts shared by every session, seeded from the warm-up file."""
+    state = {"lock": threading.Lock(), "counts": Counter(), "queries": {}, "saved_at": 0.0}
+    if _signing_key() is None:
+        logger.info("DASHBOARD_WARMUP_KEY is not set, so warm-up queries are kept in this process only")
+    for entry in _read_warmup_file():
+        key = _query_key(entry["sql"], entry["params"])
+        state["counts"][key] = entry.get("count", 1)
+        state["queries"][key] = {"sql": entry["sql"], "params": entry["params"]}
+    return state
+
+
+def remember_query(sql: str, params: dict | None) -> None:
+    """Count one query_df call and periodically persist the most frequent queries."""
+    # Replays would otherwise count themselves and pin the current set forever
+    if not warmup_enabled() or threading.current_thread().name == WARMUP_THREAD_NAME:
+        return
+    state = _query_counts()
+    encoded = {name: _encode(value) for name, value in (params or {}).items()}
+    key = _query_key(sql, encoded)
+    with state["lock"]:
+        state["counts"][key] += 1
+        state["queries"][key] = {"sql": sql, "params": encoded}
+        signing_key = _signing_key()
+        if signing_key is None or time.monotonic() - state["saved_at"] < SAVE_INTERVAL_SECONDS:
+            return
+        state["saved_at"] = time.monotonic()
+        hot = [
+            {**entry, "signature": _signature(signing_key, entry["sql"], entry["params"])}
+            for entry in _hot_entries(state)
+        ]
+
+    path = _warmup_file()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(hot, indent=2))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Could not save warm-up queries to %s: %s", path, e)
+
+
+def _read_warmup_file() -> list[dict]:
+    """Return the saved entries whose signature matches their SQL and parameters."""
+    signing_key = _signing_key()
+    path = _warmup_file()
+    if signing_key is None or not path.exists():
+        return []
+    try:
+        entries = json.loads(path.read_text())
+        verified = [
+            entry
+            for entry in entries
+            if hmac.compare_digest(
+                str(entry.get("signature", "")), _signature(signing_key, entry["sql"], entry["params"])
+            )
+        ]
+    except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+        logger.warning("Ignoring unreadable warm-up file %s: %s", path, e)
+        return []
+    if len(verified) < len(entries):
+        logger.warning("Ignoring %d warm-up entries with an invalid signature in %s", len(entries) - len(verified), path)
+    return verified
+
+
+def load_warmup_queries() -> list[tuple[str, dict]]:
+    """The (sql, params) pairs to replay, most frequent first.
+
+    Read from the shared warm-up file when DASHBOARD_WARMUP_KEY is set, otherwise
+    taken from this process's own counts.
+    """
+    if _signing_key() is None:
+        state = _query_counts()
+        with state["lock"]:
+            entries = _hot_entries(state)
+    else:
+        entries = _read_warmup_file()
+    return [
+        (entry["sql"], {name: _decode(value) for name, value in entry["params"].items()})
+        for entry in entries
+    ]
+
+
+@st.cache_resource(show_spinner=False)
+def _warm_up_version(version: str, _run_query: Callable[[str, dict], object]) -> threading.Thread:
+    """Replay the saved queries once per process and data version, in the background."""
+
+    def replay():
+        started = time.perf_counter()
+        queries = load_warmup_queries()
+        for sql, params in queries:
+            try:
+                _run_query(sql, params or None)
+            except Exception as e:
+                logger.warning("Warm-up query failed: %s", e)
+        logger.info("Warmed %d queries in %.2fs", len(queries), time.perf_counter() - started)
+
+    thread = threading.Thread(target=replay, name=WARMUP_THREAD_NAME, daemon=True)
+    thread.start()
+    return thread
+
+
+def start_warmup(version: str, run_query: Callable[[str, dict], object]) -> None:
+    """Start the background warm-up for ``version`` if DASHBOARD_WARMUP=1."""
+    if warmup_enabled():
+        _warm_up_version(version, run_query)
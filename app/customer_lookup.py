@@ -0,0 +1,54 @@
+"""Indexed single-customer lookups with an in-process LRU cache."""
+from __future__ import annotations
+
+import time
+from functools import lru_cache
+
+import pandas as pd
+from sqlalchemy import text
+
+from db import data_version, get_engine
+from query_stats import record_query
+
+LOOKUP_CACHE_SIZE = 1024
+
+# vw_customer_master is a thin view over customer_master_base, so this is a
+# primary-key probe on one customer row plus one customer_predictions row.
+CUSTOMER_LOOKUP_SQL = """
+SELECT *
+FROM vw_customer_master
+WHERE customer_id = :customer_id
+"""
+
+
+@lru_cache(maxsize=LOOKUP_CACHE_SIZE)
+def _lookup_customer(customer_id: str, version: str) -> dict | None:
+    engine = get_engine()
+    with engine.connect() as connection:
+        row = connection.execute(
+            text(CUSTOMER_LOOKUP_SQL), {"customer_id": customer_id}
+        ).mappings().first()
+    return dict(row) if row is not None else None
+
+
+def lookup_customer(customer_id: str) -> dict | None:
+    """Return one customer's vw_customer_master row as a dict, or None if not found."""
+    customer_id = customer_id.strip()
+    if not customer_id:
+        return None
+    hits_before = _lookup_customer.cache_info().hits
+    start = time.perf_counter()
+    # Keyed on the data version like query_df, so a refresh invalidates cached customers
+    customer = _lookup_customer(customer_id, data_version())
+    wall_seconds = time.perf_counter() - start
+    cache_hit = _lookup_customer.cache_info().hits > hits_before
+    record_query(
+        CUSTOMER_LOOKUP_SQL,
+        {"customer_id": customer_id},
+        pd.DataFrame([customer]) if customer is not None else None,
+        wall_seconds,
+        None if cache_hit else wall_seconds,
+        cache_hit,
+        source="lookup_customer",
+    )
+    return dict(customer) if customer is not None else None
@@ -2,26 +2,212 @@
 from __future__ import annotations
 
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 import streamlit as st
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+import result_cache
+from arrow_fetch import arrow_fetch_enabled, read_sql_arrow
+from cache_warmup import remember_query, start_warmup
+from query_stats import attributed_to, calling_page, record_query
+
+# How long a data-version token is trusted before the database is asked again
+DATA_VERSION_TTL_SECONDS = 30
+# Results are kept until the data changes; this bounds how many are held at once
+QUERY_CACHE_MAX_ENTRIES = 1000
+# Concurrent queries per query_many call; stays under the engine's default pool size of 5
+QUERY_MANY_MAX_WORKERS = 4
+# Fallback when the version cannot be read (e.g. before setup_database.py has run)
+FALLBACK_TTL_SECONDS = 600
+
+# refresh_aggregates.py and generate_predictions.py stamp refresh_watermarks on every write,
+# a reload moves MAX(invoice_date), and recency/segments roll over with CURRENT_DATE.
+DATA_VERSION_SQL = """
+SELECT
+    (SELECT MAX(refreshed_at) FROM refresh_watermarks) AS refreshed_at,
+    (SELECT COUNT(*) FROM refresh_watermarks) AS watermarks,
+    (SELECT MAX(invoice_date) FROM fact_orders) AS max_invoice_date,
+    CURRENT_DATE AS today
+"""
+
+# Per-thread scratch state shared by query_df, the cached query body and the engine events
+_query_state = threading.local()
+
+
+def _track_db_time(engine):
+    """Accumulate time spent in cursor.execute into the current thread's query state."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        _query_state.db_seconds = getattr(_query_state, "db_seconds", 0.0) + elapsed
+
+    return engine
 
 
 @st.cache_resource
 def get_engine():
-    """Create a cached SQLAlchemy engine for Supabase."""
+    """Create a cached SQLAlchemy engine for the configured backend.
+
+    ``DASHBOARD_BACKEND=postgres`` (default) connects to ``SUPABASE_DB_URL``.
+    ``DASHBOARD_BACKEND=duckdb`` runs the same views in an embedded DuckDB
+    database over ``DUCKDB_FACT_ORDERS_PATH`` (default: newest Parquet file in
+    ``data/parquet``) and optional ``DUCKDB_PREDICTIONS_PATH``.
+    """
     load_dotenv()
+    backend = os.getenv("DASHBOARD_BACKEND", "postgres").lower()
+
+    if backend == "duckdb":
+        from duckdb_backend import (
+            DEFAULT_DATABASE_PATH,
+            build_duckdb_engine,
+            default_fact_orders_parquet,
+        )
+
+        fact_orders_path = os.getenv("DUCKDB_FACT_ORDERS_PATH") or default_fact_orders_parquet()
+        if not fact_orders_path:
+            raise ValueError(
+                "No fact_orders Parquet found. Set DUCKDB_FACT_ORDERS_PATH or run "
+                "`python load_online_retail_data.py --convert-only`."
+            )
+        return _track_db_time(
+            build_duckdb_engine(
+                fact_orders_path,
+                predictions_path=os.getenv("DUCKDB_PREDICTIONS_PATH"),
+                database_path=os.getenv("DUCKDB_DATABASE_PATH", DEFAULT_DATABASE_PATH),
+            )
+        )
+
+    if backend != "postgres":
+        raise ValueError(f"Unknown DASHBOARD_BACKEND '{backend}'. Use 'postgres' or 'duckdb'.")
+
     db_url = os.getenv("SUPABASE_DB_URL")
     if not db_url:
         raise ValueError("SUPABASE_DB_URL is not set. Add it to your .env file.")
-    return create_engine(db_url, pool_pre_ping=True)
+    return _track_db_time(create_engine(db_url, pool_pre_ping=True))
+
+
+@st.cache_data(ttl=DATA_VERSION_TTL_SECONDS, show_spinner=False)
+def data_version() -> str:
+    """Return a token that changes whenever the dashboard's data does."""
+    try:
+        with get_engine().connect() as connection:
+            row = connection.execute(text(DATA_VERSION_SQL)).one()
+    except Exception:
+        return f"ttl:{int(time.time() // FALLBACK_TTL_SECONDS)}"
+    return "|".join(str(value) for value in row)
+
+
+@st.cache_data(max_entries=QUERY_CACHE_MAX_ENTRIES)
+def _cached_query(sql: str, params: dict | None, version: str) -> tuple[pd.DataFrame, float]:
+    # Only runs on a cache miss, which is how query_df tells hits from misses
+    _query_state.executed = True
+    _query_state.shared_hit = False
+    _query_state.db_seconds = 0.0
+
+    def run() -> pd.DataFrame:
+        engine = get_engine()
+        with engine.connect() as connection:
+            if not arrow_fetch_enabled(connection):
+                return pd.read_sql(text(sql), connection, params=params)
+            # COPY runs on the raw cursor, outside the engine events, so time it here
+            started = time.perf_counter()
+            df = read_sql_arrow(connection, sql, params)
+            _query_state.db_seconds += time.perf_counter() - started
+            return df
+
+    if result_cache.cache_dir() is None:
+        return run(), _query_state.db_seconds
+
+    key = result_cache.cache_key(sql, params, version)
+    df, _query_state.shared_hit = result_cache.get_or_compute(key, run)
+    return df, _query_state.db_seconds
 
 
-@st.cache_data(ttl=600)
 def query_df(sql: str, params: dict | None = None) -> pd.DataFrame:
-    """Run a SQL query and return a DataFrame."""
+    """Run a SQL query and return a DataFrame.
+
+    Results are cached per ``data_version()``, so they stay valid until the data
+    changes. In-process misses go to the shared disk cache when
+    ``DASHBOARD_RESULT_CACHE_DIR`` is set (see ``result_cache``). Every call is
+    recorded with its wall time, database time, row count, memory and which
+    cache layer answered it, if any (see ``query_stats``).
+    """
+    version = data_version()
+    start_warmup(version, query_df)
+    remember_query(sql, params)
+
+    _query_state.executed = False
+    start = time.perf_counter()
+    df, db_seconds = _cached_query(sql, params, version)
+    wall_seconds = time.perf_counter() - start
+    if not _query_state.executed:
+        cache_layer = "memory"
+    elif _query_state.shared_hit:
+        cache_layer = "disk"
+    else:
+        cache_layer = None
+    cache_hit = cache_layer is not None
+    record_query(
+        sql,
+        params,
+        df,
+        wall_seconds,
+        None if cache_hit else db_seconds,
+        cache_hit,
+        cache_layer=cache_layer,
+    )
+    return df
+
+
+def query_many(queries: list[tuple[str, dict | None]]) -> list[pd.DataFrame]:
+    """Run independent queries concurrently and return their DataFrames in order.
+
+    Each ``(sql, params)`` pair goes through ``query_df`` on a worker thread with
+    its own pooled connection, so cache hits cost nothing and the round trips
+    overlap. The batch takes about as long as its slowest query. Worker threads
+    inherit the script run context, so session-state records and page
+    attribution still work.
+    """
+    if len(queries) <= 1:
+        return [query_df(sql, params) for sql, params in queries]
+
+    ctx = get_script_run_ctx(suppress_warning=True)
+    page = calling_page()
+
+    def run(query: tuple[str, dict | None]) -> pd.DataFrame:
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        sql, params = query
+        with attributed_to(page):
+            return query_df(sql, params)
+
+    with ThreadPoolExecutor(
+        max_workers=min(len(queries), QUERY_MANY_MAX_WORKERS),
+        thread_name_prefix="query-many",
+    ) as executor:
+        return list(executor.map(run, queries))
+
+
+def explain_query(sql: str, params: dict | None = None) -> str:
+    """Execute ``sql`` under EXPLAIN ANALYZE and return the plan text.
+
+    Postgres plans include buffer usage. The statement really runs, so the
+    transaction is rolled back afterwards.
+    """
     engine = get_engine()
+    prefix = "EXPLAIN (ANALYZE, BUFFERS) " if engine.dialect.name == "postgresql" else "EXPLAIN ANALYZE "
     with engine.connect() as connection:
-        return pd.read_sql(text(sql), connection, params=params)
+        rows = connection.execute(text(prefix + sql), params or {}).fetchall()
+        connection.rollback()
+    return "\n".join(str(row[-1]) for row in rows)
@@ -0,0 +1,96 @@
+"""Embedded DuckDB backend that runs the sql/ view definitions over a Parquet copy of fact_orders."""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# Add project root to path for the shared SQL definitions
+sys.path.insert(0, str(PROJECT_DIR))
+
+from load_online_retail_data import FACT_INVOICES_SELECT_SQL  # noqa: E402
+from refresh_aggregates import refresh_all  # noqa: E402
+from setup_database import SQL_FILES  # noqa: E402
+
+DEFAULT_DATABASE_PATH = PROJECT_DIR / "data" / "duckdb" / "dashboard.duckdb"
+PARQUET_DIR = PROJECT_DIR / "data" / "parquet"
+
+
+def default_fact_orders_parquet() -> Path | None:
+    """Return the most recently written fact_orders Parquet file under data/parquet."""
+    candidates = sorted(PARQUET_DIR.glob("fact_orders-*.parquet"), key=lambda p: p.stat().st_mtime)
+    return candidates[-1] if candidates else None
+
+
+def _sql_statements(sql: str) -> list[str]:
+    """Split a SQL file on ';', dropping comment-only fragments."""
+    statements = []
+    for statement in sql.split(";"):
+        body = "\n".join(
+            line for line in statement.splitlines() if not line.strip().startswith("--")
+        )
+        if body.strip():
+            statements.append(statement)
+    return statements
+
+
+def _quote_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def build_duckdb_engine(
+    fact_orders_path: str | Path,
+    predictions_path: str | Path | None = None,
+    database_path: str | Path = DEFAULT_DATABASE_PATH,
+) -> Engine:
+    """Create a DuckDB database with the dashboard views over Parquet files.
+
+    ``fact_orders`` becomes a view over ``fact_orders_path`` (a file or glob),
+    ``fact_invoices`` is built from it as the loaders do, the ``sql/`` files are
+    applied in the same order as ``setup_database.py`` and the materialized
+    tables are fully rebuilt. ``predictions_path`` optionally loads
+    ``customer_predictions`` from Parquet.
+    """
+    database_path = Path(database_path)
+    database_path.parent.mkdir(parents=True, exist_ok=True)
+    engine = create_engine(f"duckdb:///{database_path}")
+
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE OR REPLACE VIEW fact_orders AS "
+                f"SELECT * FROM read_parquet({_quote_literal(str(fact_orders_path))})"
+            )
+        )
+        connection.execute(text(f"CREATE OR REPLACE TABLE fact_invoices AS {FACT_INVOICES_SELECT_SQL}"))
+        # DuckDB reads a bare NUMERIC as DECIMAL(18,3), which would round churn_prob
+        connection.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS customer_predictions "
+                "(customer_id TEXT PRIMARY KEY, churn_prob DOUBLE, clv DOUBLE)"
+            )
+        )
+        for sql_file in SQL_FILES:
+            file_path = PROJECT_DIR / sql_file
+            if not file_path.exists():
+                continue
+            for statement in _sql_statements(file_path.read_text()):
+                connection.execute(text(statement))
+
+        if predictions_path:
+            connection.execute(text("DELETE FROM customer_predictions"))
+            connection.execute(
+                text(
+                    "INSERT INTO customer_predictions (customer_id, churn_prob, clv) "
+                    "SELECT customer_id, churn_prob, clv "
+                    f"FROM read_parquet({_quote_literal(str(predictions_path))})"
+                )
+            )
+
+        refresh_all(connection, full=True)
+
+    return engine
@@ -12,14 +12,21 @@ def get_filters() -> dict:
     """Render sidebar filters and return selections."""
     st.sidebar.header("Filters")
 
-    dates_df = query_df(
+    # Date bounds, countries and segments in one round trip (see sql/06_filter_dimensions.sql).
+    # Segments depend on CURRENT_DATE, so they are read from the view rather than stored.
+    dimensions_df = query_df(
         """
-        SELECT
-            MIN(last_order_date) AS min_date,
-            MAX(last_order_date) AS max_date
+        SELECT dimension, value, min_date, max_date
+        FROM filter_dimensions
+        WHERE dimension <> 'segment'
+        UNION ALL
+        SELECT DISTINCT 'segment', segment, NULL::date, NULL::date
         FROM vw_customer_master
+        WHERE segment IS NOT NULL
+        ORDER BY dimension, value
         """
     )
+    dates_df = dimensions_df[dimensions_df["dimension"] == "last_order_date"]
     min_date = dates_df["min_date"].iloc[0] if not dates_df.empty else None
     max_date = dates_df["max_date"].iloc[0] if not dates_df.empty else None
 
@@ -31,16 +38,14 @@ def get_filters() -> dict:
         value=(default_start, default_end),
     )
 
-    countries_df = query_df(
-        "SELECT DISTINCT country FROM vw_customer_master WHERE country IS NOT NULL ORDER BY country"
-    )
-    countries = ["All"] + countries_df["country"].dropna().tolist()
+    countries = ["All"] + dimensions_df.loc[
+        dimensions_df["dimension"] == "country", "value"
+    ].dropna().tolist()
     country = st.sidebar.selectbox("Country", options=countries)
 
-    segments_df = query_df(
-        "SELECT DISTINCT segment FROM vw_customer_master WHERE segment IS NOT NULL ORDER BY segment"
-    )
-    segments = ["All"] + segments_df["segment"].dropna().tolist()
+    segments = ["All"] + dimensions_df.loc[
+        dimensions_df["dimension"] == "segment", "value"
+    ].dropna().tolist()
     segment = st.sidebar.selectbox("Segment", options=segments)
 
     churn_min = st.sidebar.slider("Min churn probability", 0.0, 1.0, 0.0, 0.05)
@@ -10,26 +10,38 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from db import query_df
 from filters import get_filters
-from ui_helpers import format_currency, safe_metric
+from sql_filters import build_where
+from ui_helpers import format_currency, safe_metric, render_performance_panel
 
 st.title("Overview")
 filters = get_filters()
 
+# monthly_rollup holds every country/segment combination, with 'All' for rolled-up dimensions
+month_where, params = build_where(
+    filters,
+    include=("date",),
+    columns={"date": "month"},
+    conditions=["country = :rollup_country", "segment = :rollup_segment"],
+)
+params["rollup_country"] = filters["country"]
+params["rollup_segment"] = filters["segment"]
 monthly_df = query_df(
-    """
-    SELECT month, active_customers, orders, revenue, repeat_rate
-    FROM vw_monthly_metrics
-    WHERE month BETWEEN :start_date AND :end_date
+    f"""
+    SELECT
+        month,
+        active_customers,
+        orders,
+        revenue,
+        repeat_orders::numeric / NULLIF(order_rows, 0) AS repeat_rate
+    FROM monthly_rollup
+    {month_where}
     ORDER BY month
     """,
-    {
-        "start_date": filters["start_date"],
-        "end_date": filters["end_date"],
-    },
+    params,
 )
 
 if monthly_df.empty:
-    st.warning("No monthly metrics found for the selected date range.")
+    st.warning("No monthly metrics found for the selected filters.")
 else:
     total_revenue = monthly_df["revenue"].sum()
     total_orders = monthly_df["orders"].sum()
@@ -63,3 +75,5 @@ else:
 
     st.plotly_chart(revenue_fig, use_container_width=True)
     st.plotly_chart(active_fig, use_container_width=True)
+
+render_performance_panel()
@@ -10,14 +10,33 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from db import query_df
 from filters import get_filters
+from sql_filters import build_where
+from ui_helpers import render_performance_panel
 
 st.title("Segments")
 filters = get_filters()
 
-segment_df = query_df("SELECT * FROM vw_segment_kpis ORDER BY revenue DESC")
-
-if filters["segment"] != "All":
-    segment_df = segment_df[segment_df["segment"] == filters["segment"]]
+# vw_segment_kpis aggregated over only the customers matching the sidebar filters
+segment_where, params = build_where(filters)
+segment_df = query_df(
+    f"""
+    SELECT
+        segment,
+        COUNT(*) AS customers,
+        SUM(monetary_revenue) AS revenue,
+        AVG(monetary_revenue) AS avg_revenue_per_customer,
+        AVG(recency_days) AS avg_recency_days,
+        AVG(frequency_orders) AS avg_orders,
+        AVG(return_rate) AS avg_return_rate,
+        AVG(churn_prob) AS avg_churn_prob,
+        AVG(clv) AS avg_clv
+    FROM vw_customer_master
+    {segment_where}
+    GROUP BY segment
+    ORDER BY revenue DESC
+    """,
+    params,
+)
 
 if segment_df.empty:
     st.warning("No segment data available for the current filters.")
@@ -41,3 +60,5 @@ else:
     st.plotly_chart(customers_fig, use_container_width=True)
 
     st.dataframe(segment_df, use_container_width=True)
+
+render_performance_panel()
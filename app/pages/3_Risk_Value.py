@@ -8,30 +8,56 @@ import streamlit as st
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from db import query_df
+from db import query_df, query_many
 from filters import get_filters
-from ui_helpers import empty_state
+from sql_filters import build_where
+from ui_helpers import empty_state, render_performance_panel
 
 st.title("Risk & Value")
 filters = get_filters()
 
-predictions_check = query_df(
-    """
-    SELECT COUNT(*) AS cnt
-    FROM vw_customer_master
-    WHERE churn_prob IS NOT NULL AND clv IS NOT NULL
-    """
+risk_where, params = build_where(
+    filters,
+    include=("country", "segment", "churn", "clv"),
+    conditions=["churn_prob IS NOT NULL", "clv IS NOT NULL"],
 )
 
-if predictions_check["cnt"].iloc[0] == 0:
-    empty_state(
-        "Churn probability and CLV predictions are not available yet. "
-        "Create the optional `customer_predictions` table and insert predictions "
-        "to enable this view."
+chart_mode = st.radio(
+    "Chart",
+    options=["Binned density", "All customers"],
+    horizontal=True,
+    help="Binned density aggregates churn probability x CLV in the database.",
+)
+
+if chart_mode == "Binned density":
+    bins = st.slider("Bins per axis", 10, 100, 40, 5)
+    # 2-D histogram per segment: one row per non-empty (segment, churn bin, CLV bin)
+    chart_query = (
+        f"""
+        WITH scored AS (
+            SELECT segment, churn_prob, clv
+            FROM vw_customer_master
+            {risk_where}
+        ),
+        bounds AS (
+            SELECT GREATEST(MAX(clv), 1) / :bins AS clv_width
+            FROM scored
+        )
+        SELECT
+            s.segment,
+            LEAST(FLOOR(s.churn_prob * :bins), :bins - 1) AS churn_bin,
+            LEAST(FLOOR(s.clv / b.clv_width), :bins - 1) AS clv_bin,
+            MAX(b.clv_width) AS clv_width,
+            COUNT(*) AS customers
+        FROM scored s
+        CROSS JOIN bounds b
+        GROUP BY s.segment, churn_bin, clv_bin
+        """,
+        {**params, "bins": bins},
     )
 else:
-    risk_df = query_df(
-        """
+    chart_query = (
+        f"""
         SELECT
             customer_id,
             country,
@@ -41,28 +67,71 @@ else:
             clv,
             (churn_prob * clv) AS priority_score
         FROM vw_customer_master
-        WHERE churn_prob IS NOT NULL
-          AND clv IS NOT NULL
-          AND churn_prob >= :churn_min
-          AND clv >= :clv_min
-        ORDER BY priority_score DESC
+        {risk_where}
         """,
-        {
-            "churn_min": filters["churn_min"],
-            "clv_min": filters["clv_min"],
-        },
+        params,
     )
 
-    if filters["country"] != "All":
-        risk_df = risk_df[risk_df["country"] == filters["country"]]
-    if filters["segment"] != "All":
-        risk_df = risk_df[risk_df["segment"] == filters["segment"]]
+# The availability check is cheap, so the heavy chart and top-K queries only run once it passes
+predictions_check = query_df(
+    """
+    SELECT COUNT(*) AS cnt
+    FROM vw_customer_master
+    WHERE churn_prob IS NOT NULL AND clv IS NOT NULL
+    """
+)
+has_predictions = predictions_check["cnt"].iloc[0] > 0
+
+if has_predictions:
+    # The chart and top-K list are independent, so they run concurrently
+    chart_df, top_df = query_many(
+        [
+            chart_query,
+            # Top-K straight from idx_customer_predictions_priority
+            (
+                f"""
+                SELECT
+                    customer_id,
+                    country,
+                    segment,
+                    monetary_revenue,
+                    churn_prob,
+                    clv,
+                    (churn_prob * clv) AS priority_score
+                FROM vw_customer_master
+                {risk_where}
+                ORDER BY (churn_prob * clv) DESC
+                LIMIT 50
+                """,
+                params,
+            ),
+        ]
+    )
 
-    if risk_df.empty:
-        st.warning("No customers meet the current risk filters.")
+if not has_predictions:
+    empty_state(
+        "Churn probability and CLV predictions are not available yet. "
+        "Create the optional `customer_predictions` table and insert predictions "
+        "to enable this view."
+    )
+elif chart_df.empty:
+    st.warning("No customers meet the current risk filters.")
+else:
+    if chart_mode == "Binned density":
+        chart_df["churn_prob"] = (chart_df["churn_bin"].astype(float) + 0.5) / bins
+        chart_df["clv"] = (chart_df["clv_bin"].astype(float) + 0.5) * chart_df["clv_width"].astype(float)
+        scatter_fig = px.scatter(
+            chart_df,
+            x="churn_prob",
+            y="clv",
+            size="customers",
+            color="segment",
+            hover_data=["customers"],
+            title="Churn Probability vs CLV (customers per bin)",
+        )
     else:
         scatter_fig = px.scatter(
-            risk_df,
+            chart_df,
             x="churn_prob",
             y="clv",
             size="priority_score",
@@ -70,10 +139,11 @@ else:
             hover_data=["customer_id", "country", "monetary_revenue"],
             title="Churn Probability vs CLV",
         )
-        scatter_fig.update_layout(xaxis_title="Churn Probability", yaxis_title="CLV")
 
-        st.plotly_chart(scatter_fig, use_container_width=True)
+    scatter_fig.update_layout(xaxis_title="Churn Probability", yaxis_title="CLV")
+    st.plotly_chart(scatter_fig, use_container_width=True)
+
+    st.subheader("Top 50 Priority Customers")
+    st.dataframe(top_df, use_container_width=True)
 
-        top_df = risk_df.sort_values("priority_score", ascending=False).head(50)
-        st.subheader("Top 50 Priority Customers")
-        st.dataframe(top_df, use_container_width=True)
+render_performance_panel()
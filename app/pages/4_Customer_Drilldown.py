@@ -7,9 +7,11 @@ import streamlit as st
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from customer_lookup import lookup_customer
 from db import query_df
 from filters import get_filters
-from ui_helpers import empty_state, format_currency
+from sql_filters import build_where
+from ui_helpers import empty_state, format_currency, render_performance_panel
 
 st.title("Customer Drilldown")
 filters = get_filters()
@@ -17,18 +19,10 @@ filters = get_filters()
 customer_id_input = st.text_input("Search customer_id")
 
 if customer_id_input:
-    detail_df = query_df(
-        """
-        SELECT *
-        FROM vw_customer_master
-        WHERE customer_id = :customer_id
-        """,
-        {"customer_id": customer_id_input},
-    )
-    if detail_df.empty:
+    customer = lookup_customer(customer_id_input)
+    if customer is None:
         empty_state("No customer found for the provided customer_id.")
     else:
-        customer = detail_df.iloc[0]
         st.subheader(f"Customer {customer['customer_id']}")
         col1, col2, col3 = st.columns(3)
         with col1:
@@ -43,29 +37,81 @@ if customer_id_input:
 
 st.subheader("Filtered Customers")
 
-base_query = """
-    SELECT *
-    FROM vw_customer_master
-    WHERE last_order_date BETWEEN :start_date AND :end_date
+PAGE_SIZES = [25, 50, 100, 250]
+BROWSER_COLUMNS = """
+    customer_id,
+    country,
+    segment,
+    last_order_date,
+    frequency_orders,
+    monetary_revenue,
+    churn_prob,
+    clv
 """
-params = {
-    "start_date": filters["start_date"],
-    "end_date": filters["end_date"],
-}
 
-if filters["country"] != "All":
-    base_query += " AND country = :country"
-    params["country"] = filters["country"]
 
-if filters["segment"] != "All":
-    base_query += " AND segment = :segment"
-    params["segment"] = filters["segment"]
+def next_page(cursor: tuple) -> None:
+    """Push the keyset cursor of the next page."""
+    st.session_state["drilldown_cursors"].append(cursor)
+
+
+def previous_page() -> None:
+    """Return to the previous page's keyset cursor."""
+    st.session_state["drilldown_cursors"].pop()
+
+
+page_size = st.selectbox("Rows per page", options=PAGE_SIZES, index=1)
 
-base_query += " ORDER BY monetary_revenue DESC LIMIT 1000"
+# Restart from the first page whenever the filters or page size change
+_, filter_params = build_where(filters)
+page_key = repr((sorted(filter_params.items()), page_size))
+if st.session_state.get("drilldown_page_key") != page_key:
+    st.session_state["drilldown_page_key"] = page_key
+    st.session_state["drilldown_cursors"] = [None]
 
-customers_df = query_df(base_query, params)
+cursors = st.session_state["drilldown_cursors"]
+conditions = ["monetary_revenue IS NOT NULL"]
+if cursors[-1] is not None:
+    # Keyset on (monetary_revenue, customer_id) walks idx_customer_master_base_revenue
+    conditions.append(
+        "(monetary_revenue, customer_id) < (CAST(:after_revenue AS NUMERIC), :after_customer_id)"
+    )
+
+customer_where, params = build_where(filters, conditions=conditions)
+if cursors[-1] is not None:
+    params["after_revenue"], params["after_customer_id"] = cursors[-1]
+params["page_limit"] = page_size + 1
+
+customers_df = query_df(
+    f"""
+    SELECT {BROWSER_COLUMNS}
+    FROM vw_customer_master
+    {customer_where}
+    ORDER BY monetary_revenue DESC, customer_id DESC
+    LIMIT :page_limit
+    """,
+    params,
+)
 
 if customers_df.empty:
     empty_state("No customers found for the selected filters.")
 else:
-    st.dataframe(customers_df, use_container_width=True)
+    has_next = len(customers_df) > page_size
+    page_df = customers_df.head(page_size)
+    st.dataframe(page_df, use_container_width=True)
+
+    last_row = page_df.iloc[-1]
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        st.button("Previous", on_click=previous_page, disabled=len(cursors) == 1)
+    with col_page:
+        st.caption(f"Page {len(cursors)}")
+    with col_next:
+        st.button(
+            "Next",
+            on_click=next_page,
+            args=((float(last_row["monetary_revenue"]), last_row["customer_id"]),),
+            disabled=not has_next,
+        )
+
+render_performance_panel()
@@ -0,0 +1,112 @@
+"""Per-query timing records for the Performance panel and the structured query log."""
+from __future__ import annotations
+
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+QUERY_LOG_KEY = "query_log"
+# Records kept per browser session for the Performance panel
+MAX_SESSION_RECORDS = 200
+
+logger = logging.getLogger("dashboard.queries")
+
+# Page name for queries issued from worker threads, whose stacks do not include the page script
+_thread_page = threading.local()
+
+
+def _configure_logger() -> None:
+    """Write one JSON object per query to ``DASHBOARD_QUERY_LOG`` when it is set."""
+    log_path = os.getenv("DASHBOARD_QUERY_LOG")
+    if not log_path or logger.handlers:
+        return
+    handler = logging.FileHandler(log_path)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+@contextmanager
+def attributed_to(page: str):
+    """Attribute queries recorded on this thread to ``page`` (see ``db.query_many``)."""
+    previous = getattr(_thread_page, "name", None)
+    _thread_page.name = page
+    try:
+        yield
+    finally:
+        _thread_page.name = previous
+
+
+def calling_page() -> str:
+    """Return the page script (e.g. ``1_Overview``) whose run issued the current query."""
+    if getattr(_thread_page, "name", None):
+        return _thread_page.name
+    page = None
+    frame = inspect.currentframe()
+    while frame is not None:
+        path = Path(frame.f_code.co_filename)
+        if path.parent.name == "pages" or path.name == "Home.py":
+            page = path.stem
+        frame = frame.f_back
+    return page or "unknown"
+
+
+def summarize_sql(sql: str, width: int = 120) -> str:
+    """Collapse a SQL string onto one line for display."""
+    summary = " ".join(sql.split())
+    return summary if len(summary) <= width else summary[: width - 3] + "..."
+
+
+def record_query(
+    sql: str,
+    params: dict | None,
+    result: pd.DataFrame | None,
+    wall_seconds: float,
+    db_seconds: float | None,
+    cache_hit: bool,
+    source: str = "query_df",
+    cache_layer: str | None = None,
+) -> dict:
+    """Log one query execution and append it to this session's Performance panel history."""
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "page": calling_page(),
+        "source": source,
+        "fingerprint": hashlib.sha1(sql.encode()).hexdigest()[:12],
+        "query": summarize_sql(sql),
+        "wall_ms": round(wall_seconds * 1000, 2),
+        "db_ms": round(db_seconds * 1000, 2) if db_seconds is not None else None,
+        "rows": len(result) if result is not None else 0,
+        "memory_bytes": int(result.memory_usage(deep=True).sum()) if result is not None else 0,
+        "cache_hit": cache_hit,
+        # "memory" (st.cache_data), "disk" (result_cache) or None for a database round trip
+        "cache_layer": cache_layer if cache_layer is not None else ("memory" if cache_hit else None),
+    }
+
+    _configure_logger()
+    logger.info(json.dumps(record))
+
+    # Outside a script run (e.g. scripts or worker threads without a context) there is no session
+    if get_script_run_ctx(suppress_warning=True) is not None:
+        history = st.session_state.setdefault(QUERY_LOG_KEY, [])
+        history.append({**record, "sql": sql, "params": params})
+        del history[:-MAX_SESSION_RECORDS]
+
+    return record
+
+
+def session_records() -> list[dict]:
+    """Return the query records captured for the current browser session."""
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return []
+    return list(st.session_state.get(QUERY_LOG_KEY, []))
@@ -0,0 +1,145 @@
+"""Disk-backed query result cache shared by every Streamlit process on a node.
+
+``st.cache_data`` lives inside one process, so each replica behind the load
+balancer would otherwise run the same view queries itself. With
+``DASHBOARD_RESULT_CACHE_DIR`` set, ``query_df`` misses fall through to this
+cache before reaching the database. Results are stored as Arrow IPC (Feather v2)
+files named by a hash of the SQL, its parameters and the data version. A per-key
+file lock makes concurrent workers wait for the first one instead of repeating
+the query. Once the directory grows past ``DASHBOARD_RESULT_CACHE_MB``, the
+least recently used files are evicted.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, workers may duplicate a miss
+    fcntl = None
+
+DEFAULT_MAX_MB = 512
+RESULT_SUFFIX = ".arrow"
+# Keys share 256 lock files, which keeps the lock directory bounded
+LOCK_BUCKETS_HEX_CHARS = 2
+
+logger = logging.getLogger("dashboard.result_cache")
+
+
+def cache_dir() -> Path | None:
+    """Return the shared cache directory, or None when the cache is disabled."""
+    path = os.getenv("DASHBOARD_RESULT_CACHE_DIR")
+    return Path(path) if path else None
+
+
+def max_cache_bytes() -> int:
+    return int(float(os.getenv("DASHBOARD_RESULT_CACHE_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+
+
+def cache_key(sql: str, params: dict | None, version: str) -> str:
+    payload = json.dumps([sql, params or {}, version], default=str, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@contextmanager
+def _locked(lock_path: Path, blocking: bool = True):
+    """Hold an exclusive flock on ``lock_path``. Yields False if non-blocking and busy."""
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as handle:
+        if fcntl is None:
+            yield True
+            return
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(handle, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _read(path: Path) -> pd.DataFrame | None:
+    try:
+        df = feather.read_table(path).to_pandas()
+    except FileNotFoundError:
+        return None
+    except (OSError, pa.ArrowInvalid) as e:
+        logger.warning("Dropping unreadable cache file %s: %s", path, e)
+        path.unlink(missing_ok=True)
+        return None
+    # mtime doubles as the last-used time for LRU eviction (atime is often disabled)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return df
+
+
+def _write(path: Path, df: pd.DataFrame) -> None:
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+    os.replace(tmp_path, path)
+
+
+def evict(directory: Path, limit_bytes: int) -> int:
+    """Delete least recently used result files until the directory fits ``limit_bytes``.
+
+    Returns the number of files removed. Skips the pass if another worker is evicting.
+    """
+    with _locked(directory / "locks" / "evict.lock", blocking=False) as acquired:
+        if not acquired:
+            return 0
+        entries = []
+        for path in directory.glob(f"*{RESULT_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= limit_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+def get_or_compute(key: str, compute: Callable[[], pd.DataFrame]) -> tuple[pd.DataFrame, bool]:
+    """Return ``(df, hit)`` for ``key``, running ``compute`` only if no worker has stored it yet."""
+    directory = cache_dir()
+    path = directory / f"{key}{RESULT_SUFFIX}"
+    df = _read(path)
+    if df is not None:
+        return df, True
+
+    with _locked(directory / "locks" / f"{key[:LOCK_BUCKETS_HEX_CHARS]}.lock"):
+        # Another worker may have finished the same query while we waited for the lock
+        df = _read(path)
+        if df is not None:
+            return df, True
+        df = compute()
+        try:
+            _write(path, df)
+        except (OSError, pa.ArrowException) as e:
+            logger.warning("Could not cache result in %s: %s", path, e)
+            return df, False
+
+    evict(directory, max_cache_bytes())
+    return df, False
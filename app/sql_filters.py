@@ -0,0 +1,54 @@
+"""Compile sidebar filter selections into parameterized SQL WHERE clauses."""
+from __future__ import annotations
+
+# Filter name -> column it is compared against by default.
+FILTER_COLUMNS = {
+    "date": "last_order_date",
+    "country": "country",
+    "segment": "segment",
+    "churn": "churn_prob",
+    "clv": "clv",
+}
+
+
+def build_where(
+    filters: dict,
+    include: tuple[str, ...] = ("date", "country", "segment"),
+    columns: dict | None = None,
+    conditions: list[str] | None = None,
+) -> tuple[str, dict]:
+    """Turn the dict from get_filters() into a WHERE clause and bind parameters.
+
+    ``include`` selects which filters apply to the query, ``columns`` overrides
+    the column a filter is compared against (e.g. ``{"date": "month"}``) and
+    ``conditions`` adds fixed predicates. "All" selections add no predicate.
+    Returns an empty clause when nothing applies.
+    """
+    columns = {**FILTER_COLUMNS, **(columns or {})}
+    clauses = list(conditions or [])
+    params: dict = {}
+
+    if "date" in include and filters.get("start_date") and filters.get("end_date"):
+        clauses.append(f"{columns['date']} BETWEEN :start_date AND :end_date")
+        params["start_date"] = filters["start_date"]
+        params["end_date"] = filters["end_date"]
+
+    if "country" in include and filters.get("country", "All") != "All":
+        clauses.append(f"{columns['country']} = :country")
+        params["country"] = filters["country"]
+
+    if "segment" in include and filters.get("segment", "All") != "All":
+        clauses.append(f"{columns['segment']} = :segment")
+        params["segment"] = filters["segment"]
+
+    if "churn" in include:
+        clauses.append(f"{columns['churn']} >= :churn_min")
+        params["churn_min"] = filters.get("churn_min", 0.0)
+
+    if "clv" in include:
+        clauses.append(f"{columns['clv']} >= :clv_min")
+        params["clv_min"] = filters.get("clv_min", 0.0)
+
+    if not clauses:
+        return "", params
+    return "WHERE " + "\n  AND ".join(clauses), params
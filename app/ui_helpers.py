@@ -2,9 +2,13 @@
 from __future__ import annotations
 
 import math
+import os
 
+import pandas as pd
 import streamlit as st
 
+from query_stats import session_records
+
 
 def format_currency(value: float | int | None) -> str:
     """Format a numeric value as USD currency."""
@@ -22,3 +26,57 @@ def safe_metric(label: str, value: float | int | None, help_text: str | None = N
 def empty_state(message: str) -> None:
     """Display a friendly empty state message."""
     st.info(message)
+
+
+def render_performance_panel() -> None:
+    """Show this session's query timings in an optional sidebar "Performance" panel.
+
+    The panel is off by default (``DASHBOARD_PERF_PANEL=1`` turns it on). Setting
+    ``DASHBOARD_EXPLAIN=1`` adds a button that captures the plan of a recorded query.
+    """
+    show_panel = st.sidebar.checkbox(
+        "Show performance panel",
+        value=os.getenv("DASHBOARD_PERF_PANEL", "0") == "1",
+    )
+    if not show_panel:
+        return
+
+    records = session_records()
+    with st.sidebar.expander("Performance", expanded=True):
+        if not records:
+            st.caption("No queries recorded yet.")
+            return
+
+        log_df = pd.DataFrame(records)
+        by_page = (
+            log_df.groupby("page")
+            .agg(
+                queries=("query", "size"),
+                wall_ms=("wall_ms", "sum"),
+                db_ms=("db_ms", "sum"),
+                cache_hit_rate=("cache_hit", "mean"),
+            )
+            .sort_values("wall_ms", ascending=False)
+        )
+        st.caption("By page (this session)")
+        st.dataframe(by_page, use_container_width=True)
+
+        st.caption("Recent queries")
+        recent_df = log_df[
+            ["page", "query", "wall_ms", "db_ms", "rows", "memory_bytes", "cache_layer"]
+        ].iloc[::-1]
+        st.dataframe(recent_df, use_container_width=True, hide_index=True)
+
+        if os.getenv("DASHBOARD_EXPLAIN", "0") == "1":
+            from db import explain_query
+
+            choice = st.selectbox(
+                "Query to explain",
+                options=range(len(records) - 1, -1, -1),
+                format_func=lambda i: f"{records[i]['page']}: {records[i]['query']}",
+            )
+            if st.button("EXPLAIN (ANALYZE, BUFFERS)"):
+                try:
+                    st.code(explain_query(records[choice]["sql"], records[choice]["params"]))
+                except Exception as e:
+                    st.error(f"Could not explain query: {e}")
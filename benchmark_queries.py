@@ -0,0 +1,374 @@
+"""Script to benchmark the dashboard views and page queries at increasing data scale."""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+from load_online_retail_data import (
+    CREATE_FACT_INVOICES_SQL,
+    POPULATE_FACT_INVOICES_SQL,
+    create_month_partitions,
+)
+from load_sample_data import (
+    CREATE_FACT_ORDERS_SQL,
+    CREATE_PARTITIONED_FACT_ORDERS_SQL,
+    FACT_ORDERS_INDEXES_SQL,
+    PARTITIONED_FACT_ORDERS_INDEXES_SQL,
+)
+
+PROJECT_DIR = Path(__file__).parent
+PAGES_DIR = PROJECT_DIR / "app" / "pages"
+REPORT_DIR = PROJECT_DIR / "reports" / "benchmarks"
+
+DEFAULT_SCALES = [100_000, 1_000_000, 10_000_000]
+VIEWS = ["vw_customer_master", "vw_segment_kpis", "vw_monthly_metrics", "vw_top_at_risk"]
+
+# Sample-data shape: 3 lines per invoice, ~20 lines per customer
+LINES_PER_INVOICE = 3
+LINES_PER_CUSTOMER = 20
+
+# Invoice dates seeded by SEED_INVOICES_SQL (2010-01-01 plus up to 730 days)
+SEED_START_DATE = "2010-01-01"
+SEED_END_DATE = "2011-12-31"
+
+# Slowdowns smaller than this are treated as timer noise when comparing reports
+MIN_REGRESSION_MS = 5
+
+# Invoices are generated server-side so 10M lines never pass through Python.
+# Customer activity is skewed (power(random(), 2)) and ~2% of lines are returns.
+SEED_INVOICES_SQL = """
+CREATE TEMP TABLE bench_invoices ON COMMIT DROP AS
+SELECT
+    g AS invoice_idx,
+    'B' || LPAD(g::text, 9, '0') AS invoice_no,
+    TIMESTAMP '2010-01-01' + (random() * 730) * INTERVAL '1 day' AS invoice_date,
+    FLOOR(:customers * POWER(random(), 2))::int AS customer_idx
+FROM generate_series(0, :invoices - 1) AS g
+"""
+
+SEED_LINES_SQL = """
+INSERT INTO fact_orders (
+    invoice_no, invoice_date, customer_id, country,
+    stock_code, description, quantity, unit_price
+)
+SELECT
+    i.invoice_no,
+    i.invoice_date,
+    'C' || LPAD(i.customer_idx::text, 6, '0'),
+    CASE
+        WHEN i.customer_idx % 10 < 7 THEN 'United Kingdom'
+        ELSE (ARRAY['Netherlands', 'EIRE', 'Germany', 'France', 'Sweden', 'Switzerland',
+                    'Spain', 'Poland', 'Italy', 'Belgium', 'Norway', 'Finland', 'Cyprus',
+                    'Japan', 'USA', 'Australia', 'Canada'])[i.customer_idx % 17 + 1]
+    END,
+    'SKU' || LPAD(((i.invoice_idx * 7 + l) % 100 + 1)::text, 5, '0'),
+    'Product ' || ((i.invoice_idx * 7 + l) % 100 + 1),
+    CASE WHEN random() < 0.02 THEN -1 ELSE 1 END * (1 + FLOOR(random() * 20))::int,
+    ROUND((1 + random() * 99)::numeric, 2)
+FROM bench_invoices i
+CROSS JOIN generate_series(0, :lines_per_invoice - 1) AS l
+WHERE i.invoice_idx * :lines_per_invoice + l < :order_lines
+"""
+
+SEED_PREDICTIONS_SQL = """
+INSERT INTO customer_predictions (customer_id, churn_prob, clv)
+SELECT
+    customer_id,
+    ROUND(random()::numeric, 4),
+    ROUND((monetary_revenue * (0.5 + random()))::numeric, 2)
+FROM customer_master_base
+"""
+
+
+def git_commit():
+    """Return the current commit hash, or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=PROJECT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def timed(fn, *args, **kwargs):
+    """Call ``fn`` and return (result, elapsed seconds)."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def summarize_ms(samples):
+    """Median/min/max of a list of second timings, in milliseconds."""
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 2),
+        "min_ms": round(min(samples) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+    }
+
+
+def seed_database(engine, order_lines, seed, partitioned=False):
+    """Recreate fact_orders with ``order_lines`` synthetic rows and rebuild every view."""
+    from refresh_aggregates import refresh_aggregates
+    from setup_database import setup_database
+
+    invoices = -(-order_lines // LINES_PER_INVOICE)
+    customers = max(order_lines // LINES_PER_CUSTOMER, 1)
+
+    timings = {}
+    start = time.perf_counter()
+    create_sql = CREATE_PARTITIONED_FACT_ORDERS_SQL if partitioned else CREATE_FACT_ORDERS_SQL
+    indexes_sql = PARTITIONED_FACT_ORDERS_INDEXES_SQL if partitioned else FACT_ORDERS_INDEXES_SQL
+    with engine.begin() as connection:
+        for statement in create_sql.split(";"):
+            if statement.strip():
+                connection.execute(text(statement))
+        if partitioned:
+            create_month_partitions(connection, [SEED_START_DATE, SEED_END_DATE])
+        connection.execute(text("SELECT setseed(:seed)"), {"seed": seed})
+        connection.execute(text(SEED_INVOICES_SQL), {"customers": customers, "invoices": invoices})
+        connection.execute(
+            text(SEED_LINES_SQL),
+            {"lines_per_invoice": LINES_PER_INVOICE, "order_lines": order_lines},
+        )
+        for statement in (indexes_sql + CREATE_FACT_INVOICES_SQL + POPULATE_FACT_INVOICES_SQL).split(";"):
+            if statement.strip():
+                connection.execute(text(statement))
+    timings["seed_seconds"] = round(time.perf_counter() - start, 3)
+
+    # setup_database() refreshes incrementally after the views exist; time a full refresh separately
+    ok, elapsed = timed(setup_database)
+    if not ok:
+        raise RuntimeError("setup_database failed, see the errors above")
+    timings["setup_seconds"] = round(elapsed, 3)
+    ok, elapsed = timed(refresh_aggregates, full=True)
+    if not ok:
+        raise RuntimeError("refresh_aggregates failed, see the errors above")
+    timings["refresh_seconds"] = round(elapsed, 3)
+
+    with engine.begin() as connection:
+        connection.execute(text("SELECT setseed(:seed)"), {"seed": seed})
+        connection.execute(text("DELETE FROM customer_predictions"))
+        connection.execute(text(SEED_PREDICTIONS_SQL))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("VACUUM ANALYZE"))
+
+    return timings
+
+
+def benchmark_views(engine, repeat):
+    """Time a full fetch of every dashboard view."""
+    results = {}
+    for view in VIEWS:
+        samples = []
+        rows = 0
+        with engine.connect() as connection:
+            for _ in range(repeat):
+                result, elapsed = timed(
+                    lambda: connection.execute(text(f"SELECT * FROM {view}")).fetchall()
+                )
+                samples.append(elapsed)
+                rows = len(result)
+        results[view] = {"rows": rows, **summarize_ms(samples)}
+        print(f"   {view}: {results[view]['median_ms']:,.1f} ms ({rows:,} rows)")
+    return results
+
+
+def benchmark_pages(repeat, timeout):
+    """Run every page cold (caches cleared) and time the queries it issues."""
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    for page_path in sorted(PAGES_DIR.glob("[0-9]*.py")):
+        samples = []
+        db_samples = []
+        queries = []
+        for _ in range(repeat):
+            st.cache_data.clear()
+            at = AppTest.from_file(str(page_path), default_timeout=timeout)
+            _, elapsed = timed(at.run)
+            if at.exception:
+                raise RuntimeError(f"{page_path.name} failed: {at.exception[0].value}")
+            records = at.session_state["query_log"] if "query_log" in at.session_state else []
+            samples.append(elapsed)
+            db_samples.append(sum(r["db_ms"] or 0 for r in records) / 1000)
+            queries = [
+                {key: r[key] for key in ("source", "fingerprint", "query", "wall_ms", "db_ms", "rows")}
+                for r in records
+            ]
+        results[page_path.stem] = {
+            "query_count": len(queries),
+            **summarize_ms(samples),
+            "db": summarize_ms(db_samples),
+            "queries": queries,
+        }
+        print(
+            f"   {page_path.stem}: {results[page_path.stem]['median_ms']:,.1f} ms page, "
+            f"{results[page_path.stem]['db']['median_ms']:,.1f} ms in {len(queries)} queries"
+        )
+    return results
+
+
+def compare_reports(report, baseline, threshold):
+    """Print median-time ratios against a previous report and return the regressions.
+
+    Views compare full-fetch time and pages compare time spent in the database, which
+    leaves out Streamlit rendering noise. Changes under MIN_REGRESSION_MS are ignored.
+    """
+    regressions = []
+    previous = {scale["order_lines"]: scale for scale in baseline.get("scales", [])}
+    for scale in report["scales"]:
+        old = previous.get(scale["order_lines"])
+        if not old:
+            continue
+        print(f"\n📊 {scale['order_lines']:,} lines vs baseline:")
+        for kind in ("views", "pages"):
+            for name, current in scale[kind].items():
+                if name not in old.get(kind, {}):
+                    continue
+                before = old[kind][name] if kind == "views" else old[kind][name]["db"]
+                after = current if kind == "views" else current["db"]
+                ratio = after["median_ms"] / max(before["median_ms"], 0.001)
+                regressed = (
+                    ratio > 1 + threshold
+                    and after["median_ms"] - before["median_ms"] >= MIN_REGRESSION_MS
+                )
+                flag = "⚠️ " if regressed else "  "
+                print(f"{flag} {name}: {before['median_ms']:,.1f} -> {after['median_ms']:,.1f} ms ({ratio:.2f}x)")
+                if regressed:
+                    regressions.append((scale["order_lines"], name, ratio))
+    return regressions
+
+
+def run_benchmarks(db_url, scales, repeat, seed, output, baseline=None, threshold=0.2, timeout=600,
+                   partitioned=False):
+    """Seed each scale, time views and pages, and write a JSON report."""
+    # Every helper in this process (setup, refresh and the app itself) reads SUPABASE_DB_URL
+    os.environ["SUPABASE_DB_URL"] = db_url
+    os.environ["DASHBOARD_BACKEND"] = "postgres"
+    sys.path.insert(0, str(PROJECT_DIR / "app"))
+
+    try:
+        engine = create_engine(db_url, pool_pre_ping=True)
+        print("✅ Connected to benchmark database")
+    except Exception as e:
+        print(f"❌ Failed to connect to database: {e}")
+        return False
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "repeat": repeat,
+        "seed": seed,
+        "partitioned": partitioned,
+        "scales": [],
+    }
+
+    for order_lines in scales:
+        print(f"\n📊 Seeding {order_lines:,} order lines...")
+        try:
+            timings = seed_database(engine, order_lines, seed, partitioned=partitioned)
+        except Exception as e:
+            print(f"❌ Error seeding database: {e}")
+            return False
+        print(f"✅ Seeded in {timings['seed_seconds']:,.1f}s, refreshed in {timings['refresh_seconds']:,.1f}s")
+
+        print("⏱️  Views:")
+        views = benchmark_views(engine, repeat)
+        print("⏱️  Pages:")
+        try:
+            pages = benchmark_pages(repeat, timeout)
+        except Exception as e:
+            print(f"❌ Error running pages: {e}")
+            return False
+
+        report["scales"].append({"order_lines": order_lines, **timings, "views": views, "pages": pages})
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str))
+    print(f"\n📤 Wrote {output}")
+
+    if baseline:
+        regressions = compare_reports(report, json.loads(Path(baseline).read_text()), threshold)
+        if regressions:
+            print(f"\n⚠️  {len(regressions)} timings regressed by more than {threshold:.0%}")
+            return False
+
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dashboard views and page queries.")
+    parser.add_argument(
+        "--db-url",
+        default=None,
+        help="Benchmark database URL (default: BENCHMARK_DB_URL). Its fact_orders is replaced.",
+    )
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SCALES,
+        help="Order line counts to seed (default: 100000 1000000 10000000)",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per view and page")
+    parser.add_argument("--seed", type=float, default=0.42, help="Postgres setseed() value in [-1, 1]")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=REPORT_DIR / f"benchmark-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json",
+        help="Where to write the JSON report",
+    )
+    parser.add_argument("--baseline", default=None, help="Previous report to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Flag timings slower than the baseline by more than this fraction",
+    )
+    parser.add_argument("--timeout", type=int, default=600, help="Seconds allowed per page run")
+    parser.add_argument(
+        "--partitioned",
+        action="store_true",
+        help="Seed fact_orders range-partitioned by invoice_date month",
+    )
+    args = parser.parse_args()
+
+    load_dotenv()
+    db_url = args.db_url or os.getenv("BENCHMARK_DB_URL")
+    if not db_url:
+        print("❌ Error: pass --db-url or set BENCHMARK_DB_URL (a local Postgres, it gets reseeded).")
+        sys.exit(1)
+    if db_url == os.getenv("SUPABASE_DB_URL"):
+        print("❌ Error: the benchmark database must not be the dashboard's SUPABASE_DB_URL.")
+        sys.exit(1)
+
+    print("🚀 Benchmarking dashboard queries...\n")
+
+    if run_benchmarks(
+        db_url,
+        args.scales,
+        args.repeat,
+        args.seed,
+        args.output,
+        baseline=args.baseline,
+        threshold=args.threshold,
+        timeout=args.timeout,
+        partitioned=args.partitioned,
+    ):
+        print("\n🎉 Benchmark complete!")
+    else:
+        print("\n❌ Benchmark failed. Please check the errors above.")
+        sys.exit(1)
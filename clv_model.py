@@ -0,0 +1,235 @@
+"""BG/NBD and Gamma-Gamma customer lifetime value model, vectorized with NumPy.
+
+BG/NBD (Fader, Hardie & Lee 2005) gives each customer's probability of still
+being active and their expected number of future orders. Gamma-Gamma gives
+their expected order value. Churn probability is 1 - P(alive) and CLV is
+expected orders x expected order value over the scoring horizon.
+
+Inputs follow the usual conventions, in weeks:
+- x: repeat orders (frequency_orders - 1)
+- t_x: time from first to last order
+- T: time from first order to the end of the observation window
+- m_x: average order value (negative averages are treated as 0)
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.optimize import minimize
+from scipy.special import betaln, digamma, expit, gammaln, hyp2f1
+
+DAYS_PER_PERIOD = 7
+SCORE_CHUNK_ROWS = 250_000
+
+
+def rfm_arrays(first_order_date, last_order_date, frequency_orders, monetary_revenue,
+               observation_end):
+    """Convert customer master columns into (x, t_x, T, m_x) arrays measured in weeks."""
+    first = np.asarray(first_order_date, dtype='datetime64[D]')
+    last = np.asarray(last_order_date, dtype='datetime64[D]')
+    end = np.datetime64(observation_end, 'D')
+    orders = np.asarray(frequency_orders, dtype=float)
+    revenue = np.asarray(monetary_revenue, dtype=float)
+
+    x = np.maximum(orders - 1, 0)
+    t_x = (last - first).astype(float) / DAYS_PER_PERIOD
+    T = (end - first).astype(float) / DAYS_PER_PERIOD
+    m_x = np.maximum(np.divide(revenue, orders, out=np.zeros_like(revenue), where=orders > 0), 0)
+    return x, t_x, T, m_x
+
+
+def compress_rows(*columns):
+    """Return the unique rows of ``columns`` with their counts and the inverse index."""
+    # A lexsort plus adjacent-row diff is several times faster than np.unique(axis=0)
+    order = np.lexsort(columns[::-1])
+    stacked = np.column_stack(columns)[order]
+    is_new = np.empty(len(stacked), dtype=bool)
+    is_new[:1] = True
+    is_new[1:] = np.any(stacked[1:] != stacked[:-1], axis=1)
+    group = np.cumsum(is_new) - 1
+    inverse = np.empty(len(stacked), dtype=np.intp)
+    inverse[order] = group
+    unique = stacked[is_new]
+    return [unique[:, i] for i in range(unique.shape[1])], np.bincount(group), inverse
+
+
+def bgnbd_log_likelihood(params, x, t_x, T, gradient=False):
+    """Per-customer BG/NBD log-likelihood for params (r, alpha, a, b).
+
+    With ``gradient=True`` also returns the per-customer partial derivatives
+    with respect to (r, alpha, a, b) as a (4, n) array.
+    """
+    r, alpha, a, b = params
+    repeat = x > 0
+    a1 = gammaln(r + x) - gammaln(r) + r * np.log(alpha)
+    a2 = betaln(a, b + x) - betaln(a, b)
+    a3 = -(r + x) * np.log(alpha + T)
+    # The "dropped out after the last order" term only exists for repeat customers
+    b_x = np.where(repeat, b + x - 1, 1.0)
+    a4 = np.where(repeat, np.log(a) - np.log(b_x) - (r + x) * np.log(alpha + t_x), -np.inf)
+    ll = a1 + a2 + np.logaddexp(a3, a4)
+    if not gradient:
+        return ll
+
+    # Share of the likelihood coming from the A4 term
+    w4 = np.where(repeat, expit(a4 - a3), 0.0)
+    w3 = 1 - w4
+    grad = np.empty((4, len(x)))
+    grad[0] = (
+        digamma(r + x) - digamma(r) + np.log(alpha)
+        - w3 * np.log(alpha + T) - w4 * np.log(alpha + t_x)
+    )
+    grad[1] = r / alpha - (r + x) * (w3 / (alpha + T) + w4 / (alpha + t_x))
+    grad[2] = digamma(a + b) - digamma(a + b + x) + w4 / a
+    grad[3] = (
+        digamma(b + x) - digamma(a + b + x) - digamma(b) + digamma(a + b)
+        - w4 / b_x
+    )
+    return ll, grad
+
+
+def _weighted_objective(log_likelihood, weights, penalizer):
+    """Negative mean log-likelihood and its gradient, both in log-parameter space."""
+    total = weights.sum()
+
+    def objective(log_params):
+        params = np.exp(log_params)
+        ll, grad = log_likelihood(params)
+        value = -np.sum(weights * ll) / total + penalizer * np.sum(params ** 2)
+        # d/d(log p) = p * d/dp
+        jac = (-(grad @ weights) / total + 2 * penalizer * params) * params
+        return value, jac
+
+    return objective
+
+
+def fit_bgnbd(x, t_x, T, penalizer=0.0):
+    """Fit BG/NBD by maximum likelihood and return {"r", "alpha", "a", "b"}.
+
+    Customers are compressed to unique (x, t_x, T) rows weighted by their count,
+    and the optimizer uses the analytic gradient.
+    """
+    (ux, ut_x, uT), counts, _ = compress_rows(x, t_x, T)
+    scale = max(float(np.mean(T)), 1.0)
+    objective = _weighted_objective(
+        lambda params: bgnbd_log_likelihood(params, ux, ut_x, uT, gradient=True),
+        counts.astype(float),
+        penalizer,
+    )
+    start = np.log([1.0, scale, 1.0, 1.0])
+    result = minimize(objective, start, jac=True, method='L-BFGS-B', bounds=[(-10, 10)] * 4)
+    r, alpha, a, b = np.exp(result.x)
+    return {'r': r, 'alpha': alpha, 'a': a, 'b': b}
+
+
+def gamma_gamma_log_likelihood(params, x, m_x, gradient=False):
+    """Per-customer Gamma-Gamma log-likelihood for params (p, q, v).
+
+    With ``gradient=True`` also returns the partial derivatives as a (3, n) array.
+    """
+    p, q, v = params
+    px = p * x
+    spend = np.log(x * m_x + v)
+    ll = (
+        gammaln(px + q) - gammaln(px) - gammaln(q)
+        + q * np.log(v) + (px - 1) * np.log(m_x) + px * np.log(x)
+        - (px + q) * spend
+    )
+    if not gradient:
+        return ll
+
+    grad = np.empty((3, len(x)))
+    grad[0] = x * (digamma(px + q) - digamma(px) + np.log(m_x) + np.log(x) - spend)
+    grad[1] = digamma(px + q) - digamma(q) + np.log(v) - spend
+    grad[2] = q / v - (px + q) / (x * m_x + v)
+    return ll, grad
+
+
+def fit_gamma_gamma(x, m_x, penalizer=0.0):
+    """Fit Gamma-Gamma on repeat customers with positive spend; return {"p", "q", "v"}."""
+    mask = (x > 0) & (m_x > 0)
+    x, m_x = x[mask], m_x[mask]
+    if len(x) == 0:
+        raise ValueError("Gamma-Gamma needs at least one repeat customer with positive spend")
+
+    objective = _weighted_objective(
+        lambda params: gamma_gamma_log_likelihood(params, x, m_x, gradient=True),
+        np.ones(len(x)),
+        penalizer,
+    )
+    start = np.log([1.0, 2.0, max(float(np.mean(m_x)), 1.0)])
+    result = minimize(objective, start, jac=True, method='L-BFGS-B', bounds=[(-10, 15)] * 3)
+    p, q, v = np.exp(result.x)
+    return {'p': p, 'q': q, 'v': v}
+
+
+def probability_alive(params, x, t_x, T):
+    """P(customer is still active | x, t_x, T) under BG/NBD."""
+    r, alpha, a, b = params['r'], params['alpha'], params['a'], params['b']
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        ratio = np.where(
+            x > 0,
+            a / np.maximum(b + x - 1, 1e-12) * np.exp((r + x) * np.log((alpha + T) / (alpha + t_x))),
+            0.0,
+        )
+    return 1.0 / (1.0 + ratio)
+
+
+def expected_purchases(params, t, x, t_x, T):
+    """Expected orders in the next ``t`` weeks given (x, t_x, T) under BG/NBD."""
+    r, alpha, a, b = params['r'], params['alpha'], params['a'], params['b']
+    z = t / (alpha + T + t)
+    # Euler's transformation of (1 - z)^(r + x) * 2F1(r + x, b + x; a + b + x - 1; z).
+    # The original hypergeometric term overflows for frequent buyers. This form has
+    # small numerator parameters and stays bounded.
+    decay = np.exp((a - 1) * np.log1p(-z)) * hyp2f1(a + b - 1 - r, a - 1, a + b + x - 1, z)
+    numerator = (a + b + x - 1) / (a - 1) * (1 - decay)
+    return numerator * probability_alive(params, x, t_x, T)
+
+
+def expected_order_value(params, x, m_x):
+    """Expected average order value under Gamma-Gamma (population mean for x == 0)."""
+    p, q, v = params['p'], params['q'], params['v']
+    if q <= 1:
+        raise ValueError("Gamma-Gamma expected value needs q > 1")
+    population_mean = p * v / (q - 1)
+    weight = p * x / (p * x + q - 1)
+    return np.where(x > 0, (1 - weight) * population_mean + weight * m_x, population_mean)
+
+
+def _score_chunk(args):
+    bgnbd_params, horizon, x, t_x, T = args
+    return (
+        probability_alive(bgnbd_params, x, t_x, T),
+        expected_purchases(bgnbd_params, horizon, x, t_x, T),
+    )
+
+
+def score_customers(bgnbd_params, gamma_gamma_params, x, t_x, T, m_x, horizon_days=365,
+                    workers=None, chunk_rows=SCORE_CHUNK_ROWS):
+    """Return (churn_prob, clv) arrays for every customer.
+
+    BG/NBD terms are evaluated once per unique (x, t_x, T) row. With ``workers``
+    greater than 1 those rows are scored in chunks across a process pool.
+    """
+    horizon = horizon_days / DAYS_PER_PERIOD
+    (ux, ut_x, uT), _, inverse = compress_rows(x, t_x, T)
+
+    if workers and workers > 1 and len(ux) > chunk_rows:
+        chunks = [
+            (bgnbd_params, horizon, ux[i:i + chunk_rows], ut_x[i:i + chunk_rows], uT[i:i + chunk_rows])
+            for i in range(0, len(ux), chunk_rows)
+        ]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_score_chunk, chunks))
+        p_alive = np.concatenate([alive for alive, _ in results])
+        purchases = np.concatenate([expected for _, expected in results])
+    else:
+        p_alive, purchases = _score_chunk((bgnbd_params, horizon, ux, ut_x, uT))
+
+    p_alive = p_alive[inverse]
+    purchases = purchases[inverse]
+    order_value = expected_order_value(gamma_gamma_params, x, m_x)
+
+    churn_prob = np.round(1 - p_alive, 4)
+    clv = np.round(purchases * order_value, 2)
+    return churn_prob, clv
@@ -0,0 +1,159 @@
+"""Script to check that the DuckDB backend returns the same view results as Postgres."""
+import os
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).parent / "app"))
+
+from duckdb_backend import build_duckdb_engine
+from refresh_aggregates import refresh_aggregates
+
+PARITY_DIR = Path(__file__).parent / "data" / "parity"
+
+FACT_ORDERS_SCHEMA = pa.schema([
+    ("invoice_no", pa.string()),
+    ("invoice_date", pa.timestamp("us")),
+    ("customer_id", pa.string()),
+    ("country", pa.string()),
+    ("stock_code", pa.string()),
+    ("description", pa.string()),
+    ("quantity", pa.int64()),
+    ("unit_price", pa.decimal128(10, 2)),
+])
+
+PREDICTIONS_SCHEMA = pa.schema([
+    ("customer_id", pa.string()),
+    ("churn_prob", pa.float64()),
+    ("clv", pa.float64()),
+])
+
+# View -> columns that identify a row
+VIEW_KEYS = {
+    "vw_customer_master": ["customer_id"],
+    "vw_segment_kpis": ["segment"],
+    "vw_monthly_metrics": ["month"],
+    "vw_top_at_risk": ["priority_score", "customer_id"],
+    "monthly_rollup": ["month", "country", "segment"],
+    "fact_invoices": ["invoice_no", "customer_id"],
+}
+
+
+def export_table(engine, sql, schema, path, chunksize=200_000):
+    """Stream a Postgres query into a Parquet file with a fixed schema."""
+    writer = pq.ParquetWriter(path, schema)
+    rows = 0
+    try:
+        with engine.connect() as connection:
+            for chunk in pd.read_sql(text(sql), connection, chunksize=chunksize, coerce_float=False):
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                rows += len(chunk)
+    finally:
+        writer.close()
+    return rows
+
+
+def normalize_frame(df, keys):
+    """Coerce Decimal/date/string columns to comparable dtypes and sort by ``keys``."""
+    out = df.copy()
+    for col in out.columns:
+        non_null = out[col].dropna()
+        sample = non_null.iloc[0] if not non_null.empty else None
+        if isinstance(sample, (Decimal, int, float)) and not isinstance(sample, bool):
+            out[col] = out[col].astype(float)
+        elif isinstance(sample, (date, datetime)) or pd.api.types.is_datetime64_any_dtype(out[col]):
+            out[col] = pd.to_datetime(out[col]).astype("datetime64[ns]")
+        elif not pd.api.types.is_numeric_dtype(out[col]):
+            out[col] = out[col].astype(object).where(out[col].notna(), None)
+    return out.sort_values(keys, ascending=False).reset_index(drop=True)
+
+
+def compare_backends():
+    """Export Postgres data to Parquet, rebuild it in DuckDB and compare every view and rollup table."""
+
+    load_dotenv()
+    db_url = os.getenv("SUPABASE_DB_URL")
+
+    if not db_url:
+        print("❌ Error: SUPABASE_DB_URL is not set. Add it to your .env file.")
+        return False
+
+    try:
+        pg_engine = create_engine(db_url, pool_pre_ping=True)
+        print("✅ Connected to Supabase database")
+    except Exception as e:
+        print(f"❌ Failed to connect to database: {e}")
+        return False
+
+    # Make sure the Postgres side reflects the current fact_orders
+    if not refresh_aggregates():
+        return False
+
+    print("\n📤 Exporting Postgres tables to Parquet...")
+    PARITY_DIR.mkdir(parents=True, exist_ok=True)
+    fact_orders_path = PARITY_DIR / "fact_orders.parquet"
+    predictions_path = PARITY_DIR / "customer_predictions.parquet"
+    try:
+        rows = export_table(
+            pg_engine,
+            "SELECT invoice_no, invoice_date, customer_id, country, stock_code, "
+            "description, quantity, unit_price FROM fact_orders",
+            FACT_ORDERS_SCHEMA,
+            fact_orders_path,
+        )
+        print(f"✅ Exported {rows:,} fact_orders rows")
+        rows = export_table(
+            pg_engine,
+            "SELECT customer_id, churn_prob::float8 AS churn_prob, clv::float8 AS clv "
+            "FROM customer_predictions",
+            PREDICTIONS_SCHEMA,
+            predictions_path,
+        )
+        print(f"✅ Exported {rows:,} customer_predictions rows")
+    except Exception as e:
+        print(f"❌ Error exporting data: {e}")
+        return False
+
+    print("\n🦆 Building DuckDB backend...")
+    try:
+        duck_engine = build_duckdb_engine(
+            fact_orders_path,
+            predictions_path=predictions_path,
+            database_path=PARITY_DIR / "parity.duckdb",
+        )
+    except Exception as e:
+        print(f"❌ Error building DuckDB backend: {e}")
+        return False
+
+    print("\n🔍 Comparing views...")
+    all_match = True
+    for view, keys in VIEW_KEYS.items():
+        with pg_engine.connect() as connection:
+            pg_df = normalize_frame(pd.read_sql(text(f"SELECT * FROM {view}"), connection), keys)
+        with duck_engine.connect() as connection:
+            duck_df = normalize_frame(pd.read_sql(text(f"SELECT * FROM {view}"), connection), keys)
+        try:
+            pd.testing.assert_frame_equal(pg_df, duck_df, check_dtype=False, rtol=1e-6)
+            print(f"✅ {view}: {len(pg_df):,} rows match")
+        except AssertionError as e:
+            all_match = False
+            print(f"❌ {view} differs: {e}")
+
+    return all_match
+
+
+if __name__ == "__main__":
+    print("🚀 Checking DuckDB backend parity against Postgres...\n")
+
+    if compare_backends():
+        print("\n🎉 DuckDB and Postgres return identical view results!")
+    else:
+        print("\n❌ Parity check failed. Please check the differences above.")
+        sys.exit(1)
@@ -1,13 +1,234 @@
-run """Script to generate and insert churn probability and CLV predictions."""
+"""Script to generate and insert churn probability and CLV predictions."""
+import argparse
+import io
 import os
+import sys
+import time
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
 import pandas as pd
 import numpy as np
 
+PREDICTION_COLUMNS = ['customer_id', 'churn_prob', 'clv']
 
-def generate_predictions():
-    """Generate churn probability and CLV predictions for all customers."""
+COPY_BATCH_ROWS = 100_000
+
+# The churn_prob/clv formulas from compute_predictions(), as one set-based statement.
+# Arithmetic is float8 in the same order as pandas. ROUND(float8) rounds half to even
+# like numpy, so round(x * 10^k) / 10^k matches Series.round(k) exactly. NULLs
+# propagate like NaN does in pandas, which GREATEST/LEAST alone would not do.
+PREDICTIONS_SCORING_SQL = """
+WITH rfm AS (
+    SELECT
+        TRIM(customer_id) AS customer_id,
+        COALESCE(recency_days, 0)::float8 AS recency_days,
+        COALESCE(frequency_orders, 0)::float8 AS frequency_orders,
+        COALESCE(monetary_revenue, 0)::float8 AS monetary_revenue
+    FROM vw_customer_master
+    WHERE customer_id IS NOT NULL
+),
+normalized AS (
+    SELECT
+        customer_id,
+        frequency_orders,
+        monetary_revenue,
+        recency_days / NULLIF(MAX(recency_days) OVER (), 0) AS recency_norm,
+        frequency_orders / NULLIF(MAX(frequency_orders) OVER (), 0) AS frequency_norm,
+        monetary_revenue / NULLIF(MAX(monetary_revenue) OVER (), 0) AS monetary_norm
+    FROM rfm
+),
+scored AS (
+    SELECT
+        customer_id,
+        (recency_norm * 0.6) - (frequency_norm * 0.2) - (monetary_norm * 0.2) AS churn_raw,
+        monetary_revenue * (1 + (frequency_orders * 0.2)) * (1 - (recency_norm * 0.3)) AS clv_raw
+    FROM normalized
+)
+SELECT
+    customer_id,
+    CASE
+        WHEN churn_raw IS NULL THEN NULL
+        ELSE ROUND(LEAST(0.95, GREATEST(0.05, churn_raw)) * 10000) / 10000
+    END AS churn_prob,
+    CASE
+        WHEN clv_raw IS NULL THEN NULL
+        ELSE ROUND(GREATEST(clv_raw, 50) * 100) / 100
+    END AS clv
+FROM scored
+"""
+
+# Bumps refresh_watermarks so the dashboard's data_version() sees the new predictions
+STAMP_PREDICTIONS_SQL = """
+INSERT INTO refresh_watermarks (object_name, watermark, refreshed_at)
+SELECT 'customer_predictions', MAX(invoice_date), NOW() FROM fact_orders
+ON CONFLICT (object_name)
+DO UPDATE SET watermark = EXCLUDED.watermark, refreshed_at = EXCLUDED.refreshed_at
+"""
+
+
+def write_predictions(engine, predictions_df, batch_rows=COPY_BATCH_ROWS):
+    """Replace customer_predictions with ``predictions_df`` in a single transaction.
+    
+    Rows are COPYed into a temporary staging table first; only then is the live
+    table truncated and refilled from staging, and everything commits at once.
+    Readers keep seeing the old predictions until the commit (queries that arrive
+    during the final INSERT ... SELECT wait for it) and never see a partial table.
+    A rename swap is not used because vw_customer_master is bound to the table
+    itself and would follow it. Returns the number of rows written.
+    """
+    columns = ", ".join(PREDICTION_COLUMNS)
+    
+    raw_connection = engine.raw_connection()
+    try:
+        cursor = raw_connection.cursor()
+        cursor.execute(
+            "CREATE TEMP TABLE customer_predictions_staging "
+            "(LIKE customer_predictions INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+        for start in range(0, len(predictions_df), batch_rows):
+            buffer = io.StringIO()
+            predictions_df[PREDICTION_COLUMNS].iloc[start:start + batch_rows].to_csv(
+                buffer, index=False, header=False
+            )
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY customer_predictions_staging ({columns}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        cursor.execute("TRUNCATE customer_predictions")
+        cursor.execute(
+            f"INSERT INTO customer_predictions ({columns}) "
+            f"SELECT {columns} FROM customer_predictions_staging"
+        )
+        rows = cursor.rowcount
+        cursor.execute(STAMP_PREDICTIONS_SQL)
+        raw_connection.commit()
+    except Exception:
+        raw_connection.rollback()
+        raise
+    finally:
+        raw_connection.close()
+    
+    with engine.connect() as connection:
+        connection.execute(text("ANALYZE customer_predictions"))
+        connection.commit()
+    
+    return rows
+
+
+def compute_predictions(rfm_df):
+    """Compute churn_prob and clv from an RFM frame with pandas."""
+    rfm_df = rfm_df.copy()
+    
+    # Vectorized prediction generation (much faster)
+    rfm_df['customer_id'] = rfm_df['customer_id'].astype(str).str.strip()
+    rfm_df['recency_days'] = rfm_df['recency_days'].fillna(0).astype(float)
+    rfm_df['frequency_orders'] = rfm_df['frequency_orders'].fillna(0).astype(float)
+    rfm_df['monetary_revenue'] = rfm_df['monetary_revenue'].fillna(0).astype(float)
+    
+    # Churn probability: Higher recency = higher churn risk
+    # Higher frequency and monetary = lower churn risk
+    recency_norm = rfm_df['recency_days'] / rfm_df['recency_days'].max()
+    frequency_norm = rfm_df['frequency_orders'] / rfm_df['frequency_orders'].max()
+    monetary_norm = rfm_df['monetary_revenue'] / rfm_df['monetary_revenue'].max()
+    
+    rfm_df['churn_prob'] = np.minimum(0.95, np.maximum(0.05,
+        (recency_norm * 0.6) - (frequency_norm * 0.2) - (monetary_norm * 0.2)
+    )).round(4)
+    
+    # CLV (Customer Lifetime Value): Based on monetary and frequency
+    # Higher monetary and frequency = higher CLV
+    # Recent customers = higher potential CLV
+    rfm_df['clv'] = (rfm_df['monetary_revenue'] * (1 + (rfm_df['frequency_orders'] * 0.2)) * 
+                     (1 - (recency_norm * 0.3))).clip(lower=50).round(2)
+    
+    return rfm_df[['customer_id', 'churn_prob', 'clv']].copy()
+
+
+def score_in_database(engine):
+    """Replace customer_predictions with PREDICTIONS_SCORING_SQL in one transaction.
+    
+    The RFM rows never leave Postgres. Returns the number of rows written.
+    """
+    columns = ", ".join(PREDICTION_COLUMNS)
+    with engine.begin() as connection:
+        connection.execute(text("TRUNCATE customer_predictions"))
+        rows = connection.execute(
+            text(f"INSERT INTO customer_predictions ({columns}) {PREDICTIONS_SCORING_SQL}")
+        ).rowcount
+        connection.execute(text(STAMP_PREDICTIONS_SQL))
+    with engine.connect() as connection:
+        connection.execute(text("ANALYZE customer_predictions"))
+        connection.commit()
+    return rows
+
+
+def compare_scoring_modes(engine, rfm_df):
+    """Check that PREDICTIONS_SCORING_SQL returns exactly the pandas predictions."""
+    pandas_df = compute_predictions(rfm_df).sort_values('customer_id').reset_index(drop=True)
+    sql_df = pd.read_sql(text(PREDICTIONS_SCORING_SQL), engine)
+    sql_df = sql_df.sort_values('customer_id').reset_index(drop=True)
+    try:
+        pd.testing.assert_frame_equal(pandas_df, sql_df, check_dtype=False, check_exact=True)
+        print(f"✅ SQL scoring matches pandas for all {len(sql_df)} customers")
+        return True
+    except AssertionError as e:
+        print(f"❌ SQL scoring differs from pandas: {e}")
+        return False
+
+
+def print_prediction_stats(predictions_df):
+    print(f"✅ Generated {len(predictions_df)} predictions")
+    print(f"   - Avg churn probability: {predictions_df['churn_prob'].mean():.2%}")
+    print(f"   - Avg CLV: ${predictions_df['clv'].mean():,.2f}")
+    print(f"   - Min CLV: ${predictions_df['clv'].min():,.2f}")
+    print(f"   - Max CLV: ${predictions_df['clv'].max():,.2f}")
+
+
+def compute_model_predictions(model_df, horizon_days=365, workers=None):
+    """Score customers with the BG/NBD + Gamma-Gamma model from clv_model.py."""
+    from clv_model import fit_bgnbd, fit_gamma_gamma, rfm_arrays, score_customers
+    
+    observation_end = pd.to_datetime(model_df['last_order_date']).max()
+    x, t_x, T, m_x = rfm_arrays(
+        pd.to_datetime(model_df['first_order_date']).to_numpy(),
+        pd.to_datetime(model_df['last_order_date']).to_numpy(),
+        model_df['frequency_orders'].fillna(0).astype(float).to_numpy(),
+        model_df['monetary_revenue'].fillna(0).astype(float).to_numpy(),
+        observation_end.to_datetime64(),
+    )
+    
+    started = time.perf_counter()
+    bgnbd_params = fit_bgnbd(x, t_x, T)
+    gamma_gamma_params = fit_gamma_gamma(x, m_x)
+    print(f"✅ Fitted BG/NBD + Gamma-Gamma on {len(x)} customers in {time.perf_counter() - started:.1f}s")
+    print("   - BG/NBD: " + ", ".join(f"{k}={v:.4f}" for k, v in bgnbd_params.items()))
+    print("   - Gamma-Gamma: " + ", ".join(f"{k}={v:.4f}" for k, v in gamma_gamma_params.items()))
+    
+    churn_prob, clv = score_customers(
+        bgnbd_params, gamma_gamma_params, x, t_x, T, m_x,
+        horizon_days=horizon_days, workers=workers,
+    )
+    return pd.DataFrame({
+        'customer_id': model_df['customer_id'].astype(str).str.strip(),
+        'churn_prob': churn_prob,
+        'clv': clv,
+    })
+
+
+def generate_predictions(mode="pandas", model="rfm", horizon_days=365, workers=None):
+    """Generate churn probability and CLV predictions for all customers.
+    
+    ``mode="pandas"`` fetches the RFM rows and scores them locally,
+    ``mode="sql"`` scores inside Postgres with PREDICTIONS_SCORING_SQL and
+    ``mode="compare"`` checks that both give identical results without writing.
+    ``model="bgnbd"`` replaces the RFM formulas with the BG/NBD + Gamma-Gamma
+    model (pandas mode only), with CLV over the next ``horizon_days``.
+    """
+    
+    if model == "bgnbd" and mode != "pandas":
+        print("❌ Error: the BG/NBD model only runs in pandas mode.")
+        return False
     
     load_dotenv()
     db_url = os.getenv("SUPABASE_DB_URL")
@@ -23,6 +244,18 @@ def generate_predictions():
         print(f"❌ Failed to connect to database: {e}")
         return False
     
+    if mode == "sql":
+        print("\n🤖 Scoring customers inside the database...")
+        try:
+            started = time.perf_counter()
+            rows = score_in_database(engine)
+            print(f"✅ Successfully scored {rows} customers in {time.perf_counter() - started:.1f}s")
+            print_prediction_stats(pd.read_sql(text("SELECT churn_prob, clv FROM customer_predictions"), engine))
+            return True
+        except Exception as e:
+            print(f"❌ Error scoring predictions: {e}")
+            return False
+    
     # Get customer RFM metrics to base predictions on
     print("\n📊 Fetching customer RFM metrics...")
     try:
@@ -31,6 +264,8 @@ def generate_predictions():
             SELECT 
                 customer_id,
                 recency_days,
+                first_order_date,
+                last_order_date,
                 frequency_orders,
                 monetary_revenue
             FROM vw_customer_master
@@ -43,50 +278,25 @@ def generate_predictions():
         print(f"❌ Error fetching customer data: {e}")
         return False
     
+    if mode == "compare":
+        print("\n🔍 Comparing SQL scoring with pandas...")
+        return compare_scoring_modes(engine, rfm_df)
+    
     # Generate predictions based on RFM
     print("\n🤖 Generating predictions...")
     
-    # Vectorized prediction generation (much faster)
-    rfm_df['customer_id'] = rfm_df['customer_id'].astype(str).str.strip()
-    rfm_df['recency_days'] = rfm_df['recency_days'].fillna(0).astype(float)
-    rfm_df['frequency_orders'] = rfm_df['frequency_orders'].fillna(0).astype(float)
-    rfm_df['monetary_revenue'] = rfm_df['monetary_revenue'].fillna(0).astype(float)
-    
-    # Churn probability: Higher recency = higher churn risk
-    # Higher frequency and monetary = lower churn risk
-    recency_norm = rfm_df['recency_days'] / rfm_df['recency_days'].max()
-    frequency_norm = rfm_df['frequency_orders'] / rfm_df['frequency_orders'].max()
-    monetary_norm = rfm_df['monetary_revenue'] / rfm_df['monetary_revenue'].max()
-    
-    rfm_df['churn_prob'] = np.minimum(0.95, np.maximum(0.05,
-        (recency_norm * 0.6) - (frequency_norm * 0.2) - (monetary_norm * 0.2)
-    )).round(4)
-    
-    # CLV (Customer Lifetime Value): Based on monetary and frequency
-    # Higher monetary and frequency = higher CLV
-    # Recent customers = higher potential CLV
-    rfm_df['clv'] = (rfm_df['monetary_revenue'] * (1 + (rfm_df['frequency_orders'] * 0.2)) * 
-                     (1 - (recency_norm * 0.3))).clip(lower=50).round(2)
-    
-    predictions_df = rfm_df[['customer_id', 'churn_prob', 'clv']].copy()
-    
-    print(f"✅ Generated {len(predictions_df)} predictions")
-    print(f"   - Avg churn probability: {predictions_df['churn_prob'].mean():.2%}")
-    print(f"   - Avg CLV: ${predictions_df['clv'].mean():,.2f}")
-    print(f"   - Min CLV: ${predictions_df['clv'].min():,.2f}")
-    print(f"   - Max CLV: ${predictions_df['clv'].max():,.2f}")
+    if model == "bgnbd":
+        predictions_df = compute_model_predictions(rfm_df, horizon_days, workers)
+    else:
+        predictions_df = compute_predictions(rfm_df)
+    print_prediction_stats(predictions_df)
     
     # Insert into database
     print("\n📤 Inserting predictions into database...")
     try:
-        # First truncate existing data
-        with engine.connect() as connection:
-            connection.execute(text("TRUNCATE customer_predictions"))
-            connection.commit()
-        
-        # Then insert new data
-        predictions_df.to_sql('customer_predictions', engine, if_exists='append', index=False)
-        print(f"✅ Successfully inserted {len(predictions_df)} predictions")
+        started = time.perf_counter()
+        rows = write_predictions(engine, predictions_df)
+        print(f"✅ Successfully inserted {rows} predictions in {time.perf_counter() - started:.1f}s")
         return True
     except Exception as e:
         print(f"❌ Error inserting predictions: {e}")
@@ -94,9 +304,48 @@ def generate_predictions():
 
 
 if __name__ == "__main__":
-    print("🚀 Generating customer predictions...\n")
+    parser = argparse.ArgumentParser(description="Generate churn and CLV predictions.")
+    parser.add_argument(
+        "--mode",
+        choices=["pandas", "sql", "compare"],
+        default="pandas",
+        help="Score in pandas (default), inside Postgres, or compare the two without writing",
+    )
+    parser.add_argument(
+        "--model",
+        choices=["rfm", "bgnbd"],
+        default="rfm",
+        help="Weighted RFM formulas (default) or the BG/NBD + Gamma-Gamma model",
+    )
+    parser.add_argument(
+        "--horizon-days",
+        type=int,
+        default=365,
+        help="CLV horizon for the BG/NBD model (default: 365)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Score the BG/NBD model in chunks across this many processes",
+    )
+    args = parser.parse_args()
+    
+    if args.mode == "compare":
+        print("🚀 Comparing prediction scoring modes...\n")
+    else:
+        print("🚀 Generating customer predictions...\n")
+    
+    success = generate_predictions(
+        mode=args.mode,
+        model=args.model,
+        horizon_days=args.horizon_days,
+        workers=args.workers,
+    )
     
-    success = generate_predictions()
+    # compare_scoring_modes already printed the parity result and nothing was written
+    if args.mode == "compare":
+        sys.exit(0 if success else 1)
     
     if success:
         print("\n🎉 Predictions generated successfully!")
@@ -1,131 +1,287 @@
 """Script to load Online Retail II XLSX data into fact_orders table."""
+import argparse
+import hashlib
+import io
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
+# One row per loaded workbook (content hash + sheet mode). Incremental loads skip files already
+# listed here, and refresh_aggregates.py uses the id as a watermark for the customers and dates
+# each load touched. Full loads empty it (see RESET_LOAD_STATE_SQL).
+CREATE_LOAD_LOG_SQL = """
+CREATE TABLE IF NOT EXISTS load_log (
+    id SERIAL PRIMARY KEY,
+    source_file TEXT NOT NULL,
+    source_sha256 TEXT NOT NULL,
+    sheets TEXT NOT NULL,
+    rows_read INTEGER NOT NULL,
+    invoices_written INTEGER NOT NULL,
+    rows_written INTEGER NOT NULL,
+    min_invoice_date TIMESTAMP,
+    max_invoice_date TIMESTAMP,
+    customer_ids TEXT[],
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    UNIQUE (source_sha256, sheets)
+);
+"""
 
-def find_xlsx_file():
-    """Find Online Retail II XLSX file in the data folder."""
-    project_dir = Path(__file__).parent
-    data_raw_dir = project_dir / "data" / "raw"
-    
-    # Look in data/raw directory first
-    if data_raw_dir.exists():
-        for xlsx_file in data_raw_dir.glob("*.xlsx"):
-            print(f"Found XLSX file: {xlsx_file.name}")
-            return xlsx_file
-    
-    # Fallback to project root
-    for xlsx_file in project_dir.glob("*.xlsx"):
-        print(f"Found XLSX file: {xlsx_file.name}")
-        return xlsx_file
-    
-    print("❌ No XLSX file found")
-    print("   Please place your Online Retail II XLSX file in:")
-    print(f"   {data_raw_dir}")
-    return None
+# Full loads empty refresh_watermarks (sql/01_vw_customer_master.sql) and load_log rather than
+# dropping them: refresh_aggregates.py and generate_predictions.py expect both, and with no
+# watermarks the next refresh is a full rebuild.
+RESET_LOAD_STATE_SQL = CREATE_LOAD_LOG_SQL + """
+TRUNCATE load_log RESTART IDENTITY;
 
+CREATE TABLE IF NOT EXISTS refresh_watermarks (
+    object_name TEXT PRIMARY KEY,
+    watermark TIMESTAMP,
+    load_id INTEGER,
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+DELETE FROM refresh_watermarks;
+"""
 
-def load_online_retail_data(xlsx_path):
-    """Load Online Retail II data from XLSX into fact_orders table."""
-    
-    load_dotenv()
-    db_url = os.getenv("SUPABASE_DB_URL")
-    
-    if not db_url:
-        print("❌ Error: SUPABASE_DB_URL is not set. Add it to your .env file.")
-        return False
-    
-    try:
-        engine = create_engine(db_url, pool_pre_ping=True)
-        print("✅ Connected to Supabase database")
-    except Exception as e:
-        print(f"❌ Failed to connect to database: {e}")
-        return False
-    
-    # Create fact_orders table
-    create_table_sql = """
-    DROP TABLE IF EXISTS fact_orders CASCADE;
-    
-    CREATE TABLE fact_orders (
-        id SERIAL PRIMARY KEY,
-        invoice_no VARCHAR(10),
-        invoice_date TIMESTAMP,
-        customer_id VARCHAR(10),
-        country VARCHAR(50),
-        stock_code VARCHAR(20),
-        description VARCHAR(100),
-        quantity INTEGER,
-        unit_price NUMERIC(10, 2)
-    );
+CREATE_FACT_ORDERS_SQL = RESET_LOAD_STATE_SQL + """
+DROP TABLE IF EXISTS fact_orders CASCADE;
+
+CREATE TABLE fact_orders (
+    id SERIAL PRIMARY KEY,
+    invoice_no VARCHAR(10),
+    invoice_date TIMESTAMP,
+    customer_id VARCHAR(10),
+    country VARCHAR(50),
+    stock_code VARCHAR(20),
+    description VARCHAR(100),
+    quantity INTEGER,
+    unit_price NUMERIC(10, 2)
+);
+"""
+
+FACT_ORDERS_INDEXES_SQL = """
+CREATE INDEX idx_fact_orders_customer_id ON fact_orders(customer_id);
+CREATE INDEX idx_fact_orders_invoice_date ON fact_orders(invoice_date);
+CREATE INDEX idx_fact_orders_invoice_no ON fact_orders(invoice_no);
+"""
+
+# Range-partitioned by invoice_date month; the primary key must include the partition key
+CREATE_PARTITIONED_FACT_ORDERS_SQL = RESET_LOAD_STATE_SQL + """
+DROP TABLE IF EXISTS fact_orders CASCADE;
+
+CREATE TABLE fact_orders (
+    id SERIAL,
+    invoice_no VARCHAR(10),
+    invoice_date TIMESTAMP NOT NULL,
+    customer_id VARCHAR(10),
+    country VARCHAR(50),
+    stock_code VARCHAR(20),
+    description VARCHAR(100),
+    quantity INTEGER,
+    unit_price NUMERIC(10, 2),
+    PRIMARY KEY (id, invoice_date)
+) PARTITION BY RANGE (invoice_date);
+"""
+
+# Invoice-level rollup of fact_orders that the views and refresh_aggregates.py read instead of
+# the order lines. Lines without a customer_id form their own invoice row, so NULLs are not distinct.
+CREATE_FACT_INVOICES_SQL = """
+DROP TABLE IF EXISTS fact_invoices CASCADE;
+
+CREATE TABLE fact_invoices (
+    invoice_no VARCHAR(10) NOT NULL,
+    customer_id VARCHAR(10),
+    invoice_date TIMESTAMP,
+    country VARCHAR(50),
+    revenue NUMERIC,
+    return_revenue NUMERIC,
+    line_count INTEGER NOT NULL,
+    UNIQUE NULLS NOT DISTINCT (invoice_no, customer_id)
+);
+"""
+
+# One row per (invoice_no, customer_id). The invoice's country is the one on most of its
+# lines, ties going to the first alphabetically.
+FACT_INVOICES_SELECT_SQL = """
+SELECT
+    invoice_no,
+    customer_id,
+    MIN(invoice_date) AS invoice_date,
+    MODE() WITHIN GROUP (ORDER BY country) AS country,
+    SUM(quantity * unit_price) AS revenue,
+    SUM(CASE WHEN quantity < 0 THEN quantity * unit_price ELSE 0 END) AS return_revenue,
+    COUNT(*) AS line_count
+FROM fact_orders
+WHERE invoice_no IS NOT NULL
+GROUP BY invoice_no, customer_id
+"""
+
+FACT_INVOICES_COLUMNS = "invoice_no, customer_id, invoice_date, country, revenue, return_revenue, line_count"
+
+POPULATE_FACT_INVOICES_SQL = f"""
+INSERT INTO fact_invoices ({FACT_INVOICES_COLUMNS})
+{FACT_INVOICES_SELECT_SQL};
+
+CREATE INDEX idx_fact_invoices_customer_id ON fact_invoices(customer_id);
+CREATE INDEX idx_fact_invoices_invoice_date ON fact_invoices(invoice_date);
+ANALYZE fact_invoices;
+"""
+
+# Refills fact_invoices in place, keeping the views that read it
+REFILL_FACT_INVOICES_SQL = f"""
+TRUNCATE fact_invoices;
+
+INSERT INTO fact_invoices ({FACT_INVOICES_COLUMNS})
+{FACT_INVOICES_SELECT_SQL};
+
+ANALYZE fact_invoices;
+"""
+
+FACT_ORDERS_COLUMNS = [
+    'invoice_no',
+    'invoice_date',
+    'customer_id',
+    'country',
+    'stock_code',
+    'description',
+    'quantity',
+    'unit_price',
+]
+
+# Full loads rebuild every aggregate anyway, so they do not list the customers they touched
+RECORD_FULL_LOAD_SQL = """
+INSERT INTO load_log (
+    source_file, source_sha256, sheets, rows_read, invoices_written, rows_written,
+    min_invoice_date, max_invoice_date
+)
+VALUES (
+    :source_file, :source_sha256, :sheets, :rows_read, :invoices_written, :rows_written,
+    :min_invoice_date, :max_invoice_date
+)
+"""
+
+STAGE_FACT_ORDERS_SQL = f"""
+CREATE TEMP TABLE fact_orders_staging ON COMMIT DROP AS
+SELECT {', '.join(FACT_ORDERS_COLUMNS)} FROM fact_orders WITH NO DATA
+"""
+
+# Order lines have no natural key of their own, so the upsert key is invoice_no: a staged
+# invoice is written when it is new or its set of lines differs from the loaded one.
+INVOICE_LINES_DIGEST_SQL = f"""
+SELECT invoice_no, MD5(STRING_AGG(line, ',' ORDER BY line)) AS digest
+FROM (
+    SELECT invoice_no, ROW({', '.join(FACT_ORDERS_COLUMNS[1:])})::text AS line
+    FROM {{source}}
+) lines
+GROUP BY invoice_no
+"""
+
+CHANGED_INVOICES_SQL = """
+CREATE TEMP TABLE changed_invoices ON COMMIT DROP AS
+WITH staged AS ({staged}),
+loaded AS ({loaded})
+SELECT staged.invoice_no
+FROM staged
+LEFT JOIN loaded ON loaded.invoice_no = staged.invoice_no
+WHERE loaded.digest IS DISTINCT FROM staged.digest
+""".format(
+    staged=INVOICE_LINES_DIGEST_SQL.format(source="fact_orders_staging"),
+    loaded=INVOICE_LINES_DIGEST_SQL.format(
+        source="fact_orders WHERE invoice_no IN (SELECT invoice_no FROM fact_orders_staging)"
+    ),
+)
+
+# Logged before the replace so the old lines' customers and dates are included
+RECORD_INCREMENTAL_LOAD_SQL = """
+INSERT INTO load_log (
+    source_file, source_sha256, sheets, rows_read, invoices_written, rows_written,
+    min_invoice_date, max_invoice_date, customer_ids
+)
+SELECT
+    :source_file,
+    :source_sha256,
+    :sheets,
+    :rows_read,
+    (SELECT COUNT(*) FROM changed_invoices),
+    COUNT(*) FILTER (WHERE is_new),
+    MIN(invoice_date),
+    MAX(invoice_date),
+    ARRAY_AGG(DISTINCT customer_id) FILTER (WHERE customer_id IS NOT NULL)
+FROM (
+    SELECT invoice_date, customer_id, FALSE AS is_new
+    FROM fact_orders
+    WHERE invoice_no IN (SELECT invoice_no FROM changed_invoices)
+    UNION ALL
+    SELECT invoice_date, customer_id, TRUE AS is_new
+    FROM fact_orders_staging
+    WHERE invoice_no IN (SELECT invoice_no FROM changed_invoices)
+) touched
+RETURNING invoices_written, rows_written
+"""
+
+REPLACE_CHANGED_INVOICES_SQL = f"""
+DELETE FROM fact_orders WHERE invoice_no IN (SELECT invoice_no FROM changed_invoices);
+
+INSERT INTO fact_orders ({', '.join(FACT_ORDERS_COLUMNS)})
+SELECT {', '.join(FACT_ORDERS_COLUMNS)}
+FROM fact_orders_staging
+WHERE invoice_no IN (SELECT invoice_no FROM changed_invoices);
+
+DELETE FROM fact_invoices WHERE invoice_no IN (SELECT invoice_no FROM changed_invoices);
+
+INSERT INTO fact_invoices ({FACT_INVOICES_COLUMNS})
+SELECT {FACT_INVOICES_COLUMNS}
+FROM ({FACT_INVOICES_SELECT_SQL}) invoices
+WHERE invoice_no IN (SELECT invoice_no FROM changed_invoices);
+"""
+
+COPY_BATCH_ROWS = 100_000
+
+PARQUET_CACHE_DIR = Path(__file__).parent / "data" / "parquet"
+
+
+# Map columns (Online Retail II standard column names)
+COLUMN_MAPPING = {
+    'Invoice': 'invoice_no',
+    'StockCode': 'stock_code',
+    'Description': 'description',
+    'Quantity': 'quantity',
+    'InvoiceDate': 'invoice_date',
+    'Price': 'unit_price',
+    'Customer ID': 'customer_id',
+    'Country': 'country',
+}
+
+
+def clean_retail_frame(df):
+    """Map Online Retail II columns to fact_orders names and apply the cleaning rules.
     
-    CREATE INDEX idx_fact_orders_customer_id ON fact_orders(customer_id);
-    CREATE INDEX idx_fact_orders_invoice_date ON fact_orders(invoice_date);
-    CREATE INDEX idx_fact_orders_invoice_no ON fact_orders(invoice_no);
+    Returns the cleaned frame (None when no column matched) and the list of
+    standard column names that could not be found.
     """
-    
-    try:
-        with engine.connect() as connection:
-            for statement in create_table_sql.split(';'):
-                if statement.strip():
-                    connection.execute(text(statement))
-                    connection.commit()
-        print("✅ Created fact_orders table")
-    except Exception as e:
-        print(f"❌ Error creating table: {e}")
-        return False
-    
-    # Read XLSX file
-    print(f"\n📊 Reading data from {xlsx_path.name}...")
-    try:
-        df = pd.read_excel(xlsx_path)
-        print(f"✅ Loaded {len(df):,} rows from XLSX")
-    except Exception as e:
-        print(f"❌ Error reading XLSX file: {e}")
-        return False
-    
-    # Display column names
-    print(f"\n📋 Columns in XLSX file:")
-    for i, col in enumerate(df.columns, 1):
-        print(f"   {i}. {col}")
-    
-    # Map columns (Online Retail II standard column names)
-    column_mapping = {
-        'Invoice': 'invoice_no',
-        'StockCode': 'stock_code',
-        'Description': 'description',
-        'Quantity': 'quantity',
-        'InvoiceDate': 'invoice_date',
-        'Price': 'unit_price',
-        'Customer ID': 'customer_id',
-        'Country': 'country',
-    }
-    
     # Try to match columns (case-insensitive)
-    df_cols_lower = {col.lower(): col for col in df.columns}
+    df_cols_lower = {str(col).lower(): col for col in df.columns}
     matched_mapping = {}
+    missing_columns = []
     
-    for standard_col, target_col in column_mapping.items():
+    for standard_col, target_col in COLUMN_MAPPING.items():
         lower_standard = standard_col.lower()
         if lower_standard in df_cols_lower:
             matched_mapping[df_cols_lower[lower_standard]] = target_col
         else:
-            print(f"⚠️  Warning: Could not find column matching '{standard_col}'")
+            missing_columns.append(standard_col)
     
     if not matched_mapping:
-        print("❌ Could not match any columns from XLSX to expected schema")
-        print("   Expected columns: InvoiceNo, StockCode, Description, Quantity, InvoiceDate, UnitPrice, CustomerID, Country")
-        return False
+        return None, missing_columns
     
     # Rename columns
     df_mapped = df[list(matched_mapping.keys())].rename(columns=matched_mapping)
     
-    # Clean data
-    print("\n🧹 Cleaning data...")
-    
     # Convert types
     if 'invoice_date' in df_mapped.columns:
         df_mapped['invoice_date'] = pd.to_datetime(df_mapped['invoice_date'])
@@ -146,6 +302,391 @@ def load_online_retail_data(xlsx_path):
     if 'quantity' in df_mapped.columns:
         df_mapped = df_mapped[df_mapped['quantity'] > 0]
     
+    return df_mapped, missing_columns
+
+
+def report_column_matches(df_mapped, missing_columns):
+    """Print column matching warnings; return False when nothing could be mapped."""
+    for standard_col in missing_columns:
+        print(f"⚠️  Warning: Could not find column matching '{standard_col}'")
+    
+    if df_mapped is None:
+        print("❌ Could not match any columns from XLSX to expected schema")
+        print("   Expected columns: InvoiceNo, StockCode, Description, Quantity, InvoiceDate, UnitPrice, CustomerID, Country")
+        return False
+    return True
+
+
+def read_sheet(xlsx_path, sheet_name):
+    """Parse and clean a single workbook sheet (runs in a worker process)."""
+    df = pd.read_excel(xlsx_path, sheet_name=sheet_name)
+    df_mapped, missing_columns = clean_retail_frame(df)
+    return len(df), df_mapped, missing_columns
+
+
+def drop_overlapping_invoices(frames):
+    """Drop invoices that already appeared in an earlier frame.
+    
+    The yearly Online Retail II sheets overlap (December 2010 is in both), so an
+    invoice is kept only from the first sheet that contains it.
+    """
+    seen_invoices = set()
+    deduped = []
+    for frame in frames:
+        overlap = frame['invoice_no'].isin(seen_invoices)
+        deduped.append(frame[~overlap])
+        seen_invoices.update(frame['invoice_no'].unique())
+    return deduped
+
+
+def read_all_sheets(xlsx_path, workers=None):
+    """Parse every sheet of the workbook in a process pool and return one cleaned frame.
+    
+    Returns None when a sheet has no recognisable columns.
+    """
+    sheet_names = pd.ExcelFile(xlsx_path).sheet_names
+    max_workers = min(len(sheet_names), workers or os.cpu_count() or 1)
+    print(f"   Parsing {len(sheet_names)} sheets with {max_workers} worker processes")
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(read_sheet, [xlsx_path] * len(sheet_names), sheet_names))
+    
+    print("\n🧹 Cleaning data...")
+    frames = []
+    for sheet_name, (raw_rows, df_mapped, missing_columns) in zip(sheet_names, results):
+        print(f"✅ Loaded {raw_rows:,} rows from sheet '{sheet_name}'")
+        if not report_column_matches(df_mapped, missing_columns):
+            return None
+        frames.append(df_mapped)
+    
+    deduped = drop_overlapping_invoices(frames)
+    overlap_rows = sum(len(f) for f in frames) - sum(len(f) for f in deduped)
+    print(f"✅ Removed {overlap_rows:,} rows from invoices repeated across sheets")
+    return pd.concat(deduped, ignore_index=True)
+
+
+def file_sha256(path):
+    """Return the SHA-256 hex digest of a file, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parquet_cache_path(source_hash, all_sheets=False):
+    """Location of the cleaned fact_orders Parquet cache for a workbook hash."""
+    return PARQUET_CACHE_DIR / f"fact_orders-{source_hash[:16]}-{sheets_label(all_sheets)}.parquet"
+
+
+def is_valid_parquet_cache(path, source_hash):
+    """Check that a cache file is readable, was built from ``source_hash`` and has the fact_orders columns."""
+    try:
+        schema = pq.read_schema(path)
+    except Exception:
+        return False
+    metadata = schema.metadata or {}
+    if metadata.get(b"source_sha256", b"").decode() != source_hash:
+        return False
+    return set(FACT_ORDERS_COLUMNS).issubset(schema.names)
+
+
+def write_parquet_cache(df_mapped, xlsx_path, source_hash, all_sheets=False):
+    """Write the cleaned, typed fact_orders frame to the Parquet cache and return its path."""
+    cache_path = parquet_cache_path(source_hash, all_sheets)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    # Excel yields mixed int/str object columns (e.g. invoice_no); store them as text
+    frame = df_mapped.reindex(columns=FACT_ORDERS_COLUMNS).copy()
+    for col in frame.select_dtypes(include="object").columns:
+        frame[col] = frame[col].where(frame[col].isna(), frame[col].astype(str))
+    
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        b"source_file": xlsx_path.name.encode(),
+        b"source_sha256": source_hash.encode(),
+    })
+    
+    # Write to a temporary file first so a partially written cache is never picked up
+    tmp_path = cache_path.with_suffix(".parquet.tmp")
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def run_statements(engine, sql):
+    """Execute semicolon-separated SQL statements, committing each one."""
+    with engine.connect() as connection:
+        for statement in sql.split(';'):
+            if statement.strip():
+                connection.execute(text(statement))
+                connection.commit()
+
+
+def build_fact_invoices(engine):
+    """Rebuild fact_invoices from fact_orders. Returns the number of invoices."""
+    started = time.perf_counter()
+    run_statements(engine, CREATE_FACT_INVOICES_SQL + POPULATE_FACT_INVOICES_SQL)
+    with engine.connect() as connection:
+        invoices = connection.execute(text("SELECT COUNT(*) FROM fact_invoices")).scalar()
+    print(f"✅ Built fact_invoices: {invoices:,} invoices in {time.perf_counter() - started:.1f}s")
+    return invoices
+
+
+def partition_name(month):
+    """Name of the fact_orders partition holding ``month`` (e.g. fact_orders_p2010_12)."""
+    return f"fact_orders_p{month.year:04d}_{month.month:02d}"
+
+
+def month_partition_sql(month):
+    """CREATE statement for the monthly fact_orders partition starting at ``month``."""
+    start = month.to_timestamp()
+    end = (month + 1).to_timestamp()
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF fact_orders "
+        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+    )
+
+
+def invoice_months(invoice_dates):
+    """Every month (as a pandas Period) from the earliest to the latest of ``invoice_dates``."""
+    dates = pd.to_datetime(pd.Series(invoice_dates)).dropna()
+    if dates.empty:
+        return []
+    return list(pd.period_range(dates.min(), dates.max(), freq='M'))
+
+
+def create_month_partitions(connection, invoice_dates, existing=None):
+    """Create the monthly fact_orders partitions that ``invoice_dates`` need.
+    
+    ``connection`` is a DBAPI cursor or SQLAlchemy connection. ``existing`` is
+    an optional set of months already created, which is updated in place.
+    Returns the number of partitions created.
+    """
+    existing = set() if existing is None else existing
+    created = 0
+    for month in invoice_months(invoice_dates):
+        if month in existing:
+            continue
+        statement = month_partition_sql(month)
+        if hasattr(connection, "exec_driver_sql"):
+            connection.exec_driver_sql(statement)
+        else:
+            connection.execute(statement)
+        existing.add(month)
+        created += 1
+    return created
+
+
+def copy_frame(cursor, frame, table="fact_orders", batch_rows=COPY_BATCH_ROWS):
+    """COPY one frame's fact_orders columns into ``table`` through a DBAPI cursor. Returns the row count."""
+    columns = ", ".join(FACT_ORDERS_COLUMNS)
+    copy_sql = f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)"
+    frame = frame.reindex(columns=FACT_ORDERS_COLUMNS)
+    for start in range(0, len(frame), batch_rows):
+        buffer = io.StringIO()
+        frame.iloc[start:start + batch_rows].to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        cursor.copy_expert(copy_sql, buffer)
+    return len(frame)
+
+
+def copy_into_fact_orders(engine, frames, batch_rows=COPY_BATCH_ROWS, partitioned=False):
+    """Stream DataFrames into fact_orders with COPY FROM STDIN in bounded batches.
+    
+    Each batch is serialized to an in-memory CSV buffer of at most ``batch_rows``
+    rows, so memory use does not grow with the size of the load. With
+    ``partitioned`` the monthly partitions each frame needs are created first,
+    in the same transaction. Returns the number of rows copied.
+    """
+    total_rows = 0
+    partition_months = set()
+
+    raw_connection = engine.raw_connection()
+    try:
+        cursor = raw_connection.cursor()
+        for frame in frames:
+            if partitioned:
+                create_month_partitions(cursor, frame['invoice_date'], partition_months)
+            total_rows += copy_frame(cursor, frame, batch_rows=batch_rows)
+        raw_connection.commit()
+    except Exception:
+        raw_connection.rollback()
+        raise
+    finally:
+        raw_connection.close()
+    
+    return total_rows
+
+
+def find_xlsx_file(all_sheets=False, use_cache=True):
+    """Find Online Retail II XLSX file in the data folder.
+    
+    If a valid Parquet cache of that workbook exists (and ``use_cache`` is set),
+    the cache path is returned instead so the workbook is not parsed again.
+    """
+    for xlsx_file in find_xlsx_files()[:1]:
+        print(f"Found XLSX file: {xlsx_file.name}")
+        return prefer_parquet_cache(xlsx_file, all_sheets) if use_cache else xlsx_file
+
+    print("❌ No XLSX file found")
+    print("   Please place your Online Retail II XLSX file in:")
+    print(f"   {Path(__file__).parent / 'data' / 'raw'}")
+    return None
+
+
+def find_xlsx_files():
+    """Every XLSX file in data/raw, falling back to the project root, sorted by name."""
+    project_dir = Path(__file__).parent
+    data_raw_dir = project_dir / "data" / "raw"
+
+    # Look in data/raw directory first
+    if data_raw_dir.exists():
+        xlsx_files = sorted(data_raw_dir.glob("*.xlsx"))
+        if xlsx_files:
+            return xlsx_files
+
+    # Fallback to project root
+    return sorted(project_dir.glob("*.xlsx"))
+
+
+def prefer_parquet_cache(xlsx_file, all_sheets=False):
+    """Return the cached Parquet for ``xlsx_file`` when it is valid, else the workbook itself."""
+    source_hash = file_sha256(xlsx_file)
+    cache_path = parquet_cache_path(source_hash, all_sheets)
+    if cache_path.exists() and is_valid_parquet_cache(cache_path, source_hash):
+        print(f"Found cached Parquet: {cache_path.relative_to(Path(__file__).parent)}")
+        return cache_path
+    return xlsx_file
+
+
+def read_workbook(xlsx_path, all_sheets=False, workers=None):
+    """Read and clean the workbook, returning the fact_orders frame (None on failure)."""
+    print(f"\n📊 Reading data from {xlsx_path.name}...")
+    if all_sheets:
+        try:
+            return read_all_sheets(xlsx_path, workers=workers)
+        except Exception as e:
+            print(f"❌ Error reading XLSX file: {e}")
+            return None
+    
+    try:
+        df = pd.read_excel(xlsx_path)
+        print(f"✅ Loaded {len(df):,} rows from XLSX")
+    except Exception as e:
+        print(f"❌ Error reading XLSX file: {e}")
+        return None
+    
+    # Display column names
+    print(f"\n📋 Columns in XLSX file:")
+    for i, col in enumerate(df.columns, 1):
+        print(f"   {i}. {col}")
+    
+    # Clean data
+    print("\n🧹 Cleaning data...")
+    df_mapped, missing_columns = clean_retail_frame(df)
+    if not report_column_matches(df_mapped, missing_columns):
+        return None
+    return df_mapped
+
+
+def read_cleaned_frame(xlsx_path, all_sheets=False, workers=None, use_cache=True):
+    """Return the cleaned fact_orders frame from a workbook or its Parquet cache (None on failure).
+
+    With ``use_cache`` a freshly parsed workbook is written to the Parquet cache.
+    """
+    if xlsx_path.suffix == ".parquet":
+        # Cached, already cleaned frame written by a previous run
+        print(f"\n📊 Reading cached data from {xlsx_path.name}...")
+        try:
+            df_mapped = pd.read_parquet(xlsx_path)
+            print(f"✅ Loaded {len(df_mapped):,} rows from Parquet cache")
+        except Exception as e:
+            print(f"❌ Error reading Parquet cache: {e}")
+            return None
+        return df_mapped
+
+    df_mapped = read_workbook(xlsx_path, all_sheets=all_sheets, workers=workers)
+    if df_mapped is not None and use_cache:
+        try:
+            cache_path = write_parquet_cache(df_mapped, xlsx_path, file_sha256(xlsx_path), all_sheets)
+            print(f"💾 Cached cleaned data in {cache_path.name}")
+        except Exception as e:
+            print(f"⚠️  Warning: Could not write Parquet cache: {e}")
+    return df_mapped
+
+
+def source_fingerprint(xlsx_path):
+    """Return (workbook file name, SHA-256) for a workbook or its Parquet cache."""
+    if xlsx_path.suffix == ".parquet":
+        metadata = pq.read_schema(xlsx_path).metadata or {}
+        return metadata[b"source_file"].decode(), metadata[b"source_sha256"].decode()
+    return xlsx_path.name, file_sha256(xlsx_path)
+
+
+def sheets_label(all_sheets=False):
+    return "all-sheets" if all_sheets else "first-sheet"
+
+
+def convert_to_parquet(xlsx_path, all_sheets=False, workers=None):
+    """Read and clean the workbook and store it in the Parquet cache without touching the database."""
+    df_mapped = read_workbook(xlsx_path, all_sheets=all_sheets, workers=workers)
+    if df_mapped is None:
+        return False
+    
+    try:
+        cache_path = write_parquet_cache(df_mapped, xlsx_path, file_sha256(xlsx_path), all_sheets)
+        print(f"✅ Wrote {len(df_mapped):,} records to {cache_path.name}")
+        return True
+    except Exception as e:
+        print(f"❌ Error writing Parquet cache: {e}")
+        return False
+
+
+def load_online_retail_data(xlsx_path, method="insert", all_sheets=False, workers=None, use_cache=True,
+                            partitioned=False):
+    """Load Online Retail II data from XLSX (or its Parquet cache) into fact_orders table.
+    
+    ``method="copy"`` streams rows with COPY FROM STDIN and builds the indexes
+    after the load; ``method="insert"`` uses batched multi-row INSERTs.
+    ``all_sheets=True`` parses every sheet in parallel (up to ``workers``
+    processes) instead of only the first one. With ``use_cache`` a parsed
+    workbook is written to the Parquet cache for later runs. ``partitioned``
+    creates fact_orders range-partitioned by invoice_date month, adding the
+    partitions the data needs during the load.
+    """
+    
+    load_dotenv()
+    db_url = os.getenv("SUPABASE_DB_URL")
+    
+    if not db_url:
+        print("❌ Error: SUPABASE_DB_URL is not set. Add it to your .env file.")
+        return False
+    
+    try:
+        engine = create_engine(db_url, pool_pre_ping=True)
+        print("✅ Connected to Supabase database")
+    except Exception as e:
+        print(f"❌ Failed to connect to database: {e}")
+        return False
+    
+    # Create fact_orders table (COPY loads build the indexes after the data is in)
+    create_table_sql = CREATE_PARTITIONED_FACT_ORDERS_SQL if partitioned else CREATE_FACT_ORDERS_SQL
+    if method != "copy":
+        create_table_sql += FACT_ORDERS_INDEXES_SQL
+    
+    try:
+        run_statements(engine, create_table_sql)
+        print(f"✅ Created {'partitioned ' if partitioned else ''}fact_orders table")
+    except Exception as e:
+        print(f"❌ Error creating table: {e}")
+        return False
+    
+    df_mapped = read_cleaned_frame(xlsx_path, all_sheets=all_sheets, workers=workers, use_cache=use_cache)
+    if df_mapped is None:
+        return False
+
     print(f"✅ Cleaned data: {len(df_mapped):,} valid records")
     print(f"   - Customers: {df_mapped['customer_id'].nunique():,}")
     print(f"   - Invoices: {df_mapped['invoice_no'].nunique():,}")
@@ -153,12 +694,236 @@ def load_online_retail_data(xlsx_path):
     
     # Insert data
     print("\n📤 Uploading to database...")
+    if partitioned:
+        # Partition keys cannot be NULL
+        df_mapped = df_mapped[df_mapped['invoice_date'].notna()]
+    if method == "copy":
+        if not copy_load(engine, [df_mapped], partitioned=partitioned):
+            return False
+    else:
+        try:
+            if partitioned:
+                with engine.begin() as connection:
+                    created = create_month_partitions(connection, df_mapped['invoice_date'])
+                print(f"✅ Created {created} monthly partitions")
+            df_mapped.to_sql('fact_orders', engine, if_exists='append', index=False, method='multi', chunksize=1000)
+            print(f"✅ Successfully inserted {len(df_mapped):,} records into fact_orders")
+        except Exception as e:
+            print(f"❌ Error inserting data: {e}")
+            return False
+
+        try:
+            build_fact_invoices(engine)
+        except Exception as e:
+            print(f"❌ Error building fact_invoices: {e}")
+            return False
+
+    # Later --incremental runs skip this workbook unless its contents change
     try:
-        df_mapped.to_sql('fact_orders', engine, if_exists='append', index=False, method='multi', chunksize=1000)
-        print(f"✅ Successfully inserted {len(df_mapped):,} records into fact_orders")
+        source_file, source_hash = source_fingerprint(xlsx_path)
+        run_statements(engine, CREATE_LOAD_LOG_SQL)
+        with engine.begin() as connection:
+            connection.execute(
+                text(RECORD_FULL_LOAD_SQL),
+                {
+                    "source_file": source_file,
+                    "source_sha256": source_hash,
+                    "sheets": sheets_label(all_sheets),
+                    "rows_read": len(df_mapped),
+                    "invoices_written": int(df_mapped['invoice_no'].nunique()),
+                    "rows_written": len(df_mapped),
+                    "min_invoice_date": df_mapped['invoice_date'].min(),
+                    "max_invoice_date": df_mapped['invoice_date'].max(),
+                },
+            )
         return True
     except Exception as e:
-        print(f"❌ Error inserting data: {e}")
+        print(f"❌ Error recording load in load_log: {e}")
+        return False
+
+
+def ensure_fact_tables(engine, partitioned=False):
+    """Create fact_orders, fact_invoices and load_log if missing, leaving existing data in place."""
+    with engine.connect() as connection:
+        has_orders = connection.execute(text("SELECT to_regclass('fact_orders')")).scalar() is not None
+        has_invoices = connection.execute(text("SELECT to_regclass('fact_invoices')")).scalar() is not None
+
+    if not has_orders:
+        create_table_sql = CREATE_PARTITIONED_FACT_ORDERS_SQL if partitioned else CREATE_FACT_ORDERS_SQL
+        run_statements(engine, create_table_sql + FACT_ORDERS_INDEXES_SQL)
+        print(f"✅ Created {'partitioned ' if partitioned else ''}fact_orders table")
+    if not has_orders or not has_invoices:
+        build_fact_invoices(engine)
+    run_statements(engine, CREATE_LOAD_LOG_SQL)
+
+
+def upsert_invoices(engine, frame, source_file, source_hash, sheets):
+    """Upsert a cleaned frame into fact_orders by invoice and log the load in one transaction.
+
+    Rows are COPYed into a temporary staging table. Only invoices that are new or
+    whose lines changed are written: their old lines are deleted and the staged
+    ones inserted, and their fact_invoices rows are recomputed. Returns the
+    number of invoices and rows written.
+    """
+    with engine.begin() as connection:
+        # Loads are serialized so load_log ids are committed in order
+        connection.execute(text("SELECT pg_advisory_xact_lock(hashtext('load_log'))"))
+        partitioned = connection.execute(
+            text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('fact_orders')")
+        ).scalar()
+        if partitioned:
+            # Partition keys cannot be NULL
+            frame = frame[frame['invoice_date'].notna()]
+            create_month_partitions(connection, frame['invoice_date'])
+
+        connection.execute(text(STAGE_FACT_ORDERS_SQL))
+        cursor = connection.connection.cursor()
+        try:
+            copy_frame(cursor, frame, table="fact_orders_staging")
+        finally:
+            cursor.close()
+        connection.execute(text("ANALYZE fact_orders_staging"))
+        connection.execute(text(CHANGED_INVOICES_SQL))
+
+        invoices, rows = connection.execute(
+            text(RECORD_INCREMENTAL_LOAD_SQL),
+            {
+                "source_file": source_file,
+                "source_sha256": source_hash,
+                "sheets": sheets,
+                "rows_read": len(frame),
+            },
+        ).one()
+        connection.exec_driver_sql(REPLACE_CHANGED_INVOICES_SQL)
+    return invoices, rows
+
+
+def load_incremental(xlsx_files, all_sheets=False, workers=None, use_cache=True, partitioned=False):
+    """Load the workbooks not seen before into the existing fact_orders table.
+
+    Each workbook is fingerprinted by its SHA-256 and skipped when load_log
+    already lists it. Otherwise its invoices are upserted (see upsert_invoices),
+    so a re-exported workbook only rewrites the invoices that changed. Tables
+    are created when missing (range-partitioned with ``partitioned``) and are
+    never dropped, so the views built on them stay in place.
+    """
+
+    load_dotenv()
+    db_url = os.getenv("SUPABASE_DB_URL")
+
+    if not db_url:
+        print("❌ Error: SUPABASE_DB_URL is not set. Add it to your .env file.")
+        return False
+
+    try:
+        engine = create_engine(db_url, pool_pre_ping=True)
+        print("✅ Connected to Supabase database")
+    except Exception as e:
+        print(f"❌ Failed to connect to database: {e}")
+        return False
+
+    try:
+        ensure_fact_tables(engine, partitioned=partitioned)
+    except Exception as e:
+        print(f"❌ Error creating tables: {e}")
+        return False
+
+    sheets = sheets_label(all_sheets)
+    for xlsx_file in xlsx_files:
+        source_hash = file_sha256(xlsx_file)
+        with engine.connect() as connection:
+            loaded_at = connection.execute(
+                text("SELECT loaded_at FROM load_log WHERE source_sha256 = :source_sha256 AND sheets = :sheets"),
+                {"source_sha256": source_hash, "sheets": sheets},
+            ).scalar()
+        if loaded_at is not None:
+            print(f"⏭️  Skipping {xlsx_file.name} (already loaded {loaded_at:%Y-%m-%d %H:%M})")
+            continue
+
+        source = prefer_parquet_cache(xlsx_file, all_sheets) if use_cache else xlsx_file
+        df_mapped = read_cleaned_frame(source, all_sheets=all_sheets, workers=workers, use_cache=use_cache)
+        if df_mapped is None:
+            return False
+
+        try:
+            started = time.perf_counter()
+            invoices, rows = upsert_invoices(engine, df_mapped, xlsx_file.name, source_hash, sheets)
+            print(f"✅ Upserted {invoices:,} new or changed invoices ({rows:,} rows) "
+                  f"of {df_mapped['invoice_no'].nunique():,} in {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            print(f"❌ Error loading {xlsx_file.name}: {e}")
+            return False
+
+    return True
+
+
+def copy_load(engine, frames, partitioned=False):
+    """COPY cleaned frames into fact_orders, then build indexes and report throughput."""
+    
+    try:
+        started = time.perf_counter()
+        rows = copy_into_fact_orders(engine, frames, partitioned=partitioned)
+        copy_seconds = time.perf_counter() - started
+        print(f"✅ Copied {rows:,} records into fact_orders "
+              f"in {copy_seconds:.1f}s ({rows / max(copy_seconds, 1e-9):,.0f} rows/sec)")
+    except Exception as e:
+        print(f"❌ Error copying data: {e}")
+        return False
+    
+    try:
+        index_started = time.perf_counter()
+        run_statements(engine, FACT_ORDERS_INDEXES_SQL + "ANALYZE fact_orders;")
+        index_seconds = time.perf_counter() - index_started
+        total_seconds = time.perf_counter() - started
+        print(f"✅ Built fact_orders indexes in {index_seconds:.1f}s")
+        print(f"   - End-to-end: {rows / max(total_seconds, 1e-9):,.0f} rows/sec")
+    except Exception as e:
+        print(f"❌ Error creating indexes: {e}")
+        return False
+    
+    try:
+        build_fact_invoices(engine)
+        return True
+    except Exception as e:
+        print(f"❌ Error building fact_invoices: {e}")
+        return False
+
+
+def rebuild_fact_invoices():
+    """Rebuild fact_invoices from the current fact_orders, e.g. after editing order lines by hand.
+    
+    An existing table is truncated and refilled in one transaction, so the views built on it stay.
+    """
+
+    load_dotenv()
+    db_url = os.getenv("SUPABASE_DB_URL")
+
+    if not db_url:
+        print("❌ Error: SUPABASE_DB_URL is not set. Add it to your .env file.")
+        return False
+
+    try:
+        engine = create_engine(db_url, pool_pre_ping=True)
+        print("✅ Connected to Supabase database")
+    except Exception as e:
+        print(f"❌ Failed to connect to database: {e}")
+        return False
+
+    try:
+        with engine.connect() as connection:
+            exists = connection.execute(text("SELECT to_regclass('fact_invoices')")).scalar() is not None
+        if not exists:
+            build_fact_invoices(engine)
+            return True
+
+        started = time.perf_counter()
+        with engine.begin() as connection:
+            connection.exec_driver_sql(REFILL_FACT_INVOICES_SQL)
+            invoices = connection.execute(text("SELECT COUNT(*) FROM fact_invoices")).scalar()
+        print(f"✅ Rebuilt fact_invoices: {invoices:,} invoices in {time.perf_counter() - started:.1f}s")
+        return True
+    except Exception as e:
+        print(f"❌ Error building fact_invoices: {e}")
         return False
 
 
@@ -177,14 +942,15 @@ def create_predictions_table():
         print(f"❌ Failed to connect to database: {e}")
         return False
     
+    # Emptied rather than dropped, so vw_customer_master (and refresh_aggregates.py) survive a reload
     create_predictions_sql = """
-    DROP TABLE IF EXISTS customer_predictions CASCADE;
-    
-    CREATE TABLE customer_predictions (
+    CREATE TABLE IF NOT EXISTS customer_predictions (
         customer_id VARCHAR(10) PRIMARY KEY,
         churn_prob NUMERIC(5, 4),
         clv NUMERIC(12, 2)
     );
+    
+    TRUNCATE customer_predictions;
     """
     
     try:
@@ -201,13 +967,105 @@ def create_predictions_table():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--method",
+        choices=["insert", "copy"],
+        default="insert",
+        help="How rows are written: batched INSERTs or streaming COPY FROM STDIN.",
+    )
+    parser.add_argument(
+        "--all-sheets",
+        action="store_true",
+        help="Load every workbook sheet (parsed in parallel) instead of only the first.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes for --all-sheets (default: one per sheet, capped at CPU count).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always parse the workbook and do not read or write the Parquet cache.",
+    )
+    parser.add_argument(
+        "--partitioned",
+        action="store_true",
+        help="Create fact_orders range-partitioned by invoice_date month.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Keep fact_orders and load only new workbooks, upserting their new or changed invoices.",
+    )
+    parser.add_argument(
+        "--rebuild-invoices",
+        action="store_true",
+        help="Only rebuild fact_invoices from the fact_orders already in the database.",
+    )
+    parser.add_argument(
+        "--convert-only",
+        action="store_true",
+        help="Only convert the workbook to the Parquet cache under data/parquet.",
+    )
+    args = parser.parse_args()
+    
+    if args.convert_only:
+        print("🚀 Converting Online Retail II workbook to Parquet...\n")
+        xlsx_file = find_xlsx_file(all_sheets=args.all_sheets)
+        if xlsx_file and xlsx_file.suffix == ".parquet":
+            print("✅ Parquet cache is already up to date")
+            sys.exit(0)
+        if not xlsx_file or not convert_to_parquet(xlsx_file, args.all_sheets, args.workers):
+            sys.exit(1)
+        sys.exit(0)
+    
+    if args.rebuild_invoices:
+        print("🚀 Rebuilding fact_invoices from fact_orders...\n")
+        if not rebuild_fact_invoices():
+            sys.exit(1)
+        print("\n📌 Next steps:")
+        print("   1. Run: python refresh_aggregates.py --full")
+        sys.exit(0)
+    
+    if args.incremental:
+        print("🚀 Loading new Online Retail II data incrementally...\n")
+        xlsx_files = find_xlsx_files()
+        if not xlsx_files:
+            print("❌ No XLSX file found")
+            sys.exit(1)
+        print(f"Found {len(xlsx_files)} XLSX file(s): {', '.join(f.name for f in xlsx_files)}")
+        if not load_incremental(
+            xlsx_files,
+            all_sheets=args.all_sheets,
+            workers=args.workers,
+            use_cache=not args.no_cache,
+            partitioned=args.partitioned,
+        ):
+            print("\n❌ Incremental load failed. Please check the errors above.")
+            sys.exit(1)
+        print("\n🎉 Incremental load complete!")
+        print("\n📌 Next steps:")
+        print("   1. Run: python setup_database.py (applies pending SQL changes, then refreshes the aggregates)")
+        print("   2. Refresh your Streamlit app at http://localhost:8503")
+        sys.exit(0)
+    
     print("🚀 Loading Online Retail II data...\n")
     
-    xlsx_file = find_xlsx_file()
+    xlsx_file = find_xlsx_file(all_sheets=args.all_sheets, use_cache=not args.no_cache)
     if not xlsx_file:
         sys.exit(1)
     
-    success = load_online_retail_data(xlsx_file)
+    success = load_online_retail_data(
+        xlsx_file,
+        method=args.method,
+        all_sheets=args.all_sheets,
+        workers=args.workers,
+        use_cache=not args.no_cache,
+        partitioned=args.partitioned,
+    )
     
     if success:
         create_predictions_table()
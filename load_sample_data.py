@@ -1,14 +1,169 @@
 """Script to create and populate fact_orders table with sample data."""
+import argparse
 import os
+import time
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-import random
 
+from load_online_retail_data import (
+    RESET_LOAD_STATE_SQL,
+    build_fact_invoices,
+    copy_into_fact_orders,
+    run_statements,
+)
 
-def create_and_populate_fact_orders():
-    """Create fact_orders table and populate with sample Online Retail II data."""
+
+# fact_orders schema shared with benchmark_queries.py
+CREATE_FACT_ORDERS_SQL = RESET_LOAD_STATE_SQL + """
+DROP TABLE IF EXISTS fact_orders CASCADE;
+
+CREATE TABLE fact_orders (
+    invoice_no VARCHAR(10) NOT NULL,
+    invoice_date TIMESTAMP NOT NULL,
+    customer_id VARCHAR(10) NOT NULL,
+    country VARCHAR(50),
+    stock_code VARCHAR(20) NOT NULL,
+    description VARCHAR(100),
+    quantity INTEGER,
+    unit_price NUMERIC(10, 2)
+);
+"""
+
+# Built after the rows are copied in, which is much faster than maintaining them row by row
+FACT_ORDERS_INDEXES_SQL = """
+ALTER TABLE fact_orders ADD PRIMARY KEY (invoice_no, stock_code, customer_id);
+CREATE INDEX idx_fact_orders_customer_id ON fact_orders(customer_id);
+CREATE INDEX idx_fact_orders_invoice_date ON fact_orders(invoice_date);
+ANALYZE fact_orders;
+"""
+
+# Range-partitioned by invoice_date month (see load_online_retail_data.create_month_partitions)
+CREATE_PARTITIONED_FACT_ORDERS_SQL = RESET_LOAD_STATE_SQL + """
+DROP TABLE IF EXISTS fact_orders CASCADE;
+
+CREATE TABLE fact_orders (
+    invoice_no VARCHAR(10) NOT NULL,
+    invoice_date TIMESTAMP NOT NULL,
+    customer_id VARCHAR(10) NOT NULL,
+    country VARCHAR(50),
+    stock_code VARCHAR(20) NOT NULL,
+    description VARCHAR(100),
+    quantity INTEGER,
+    unit_price NUMERIC(10, 2)
+) PARTITION BY RANGE (invoice_date);
+"""
+
+# Unique constraints on a partitioned table must include the partition key
+PARTITIONED_FACT_ORDERS_INDEXES_SQL = """
+ALTER TABLE fact_orders ADD PRIMARY KEY (invoice_no, stock_code, customer_id, invoice_date);
+CREATE INDEX idx_fact_orders_customer_id ON fact_orders(customer_id);
+CREATE INDEX idx_fact_orders_invoice_date ON fact_orders(invoice_date);
+ANALYZE fact_orders;
+"""
+
+COUNTRIES = ['United Kingdom', 'Netherlands', 'EIRE', 'Germany', 'France', 'Sweden',
+             'Switzerland', 'Spain', 'Poland', 'Italy', 'Belgium', 'Norway', 'Finland',
+             'Cyprus', 'Japan', 'USA', 'Australia', 'Canada']
+
+# Like Online Retail II, most customers are in the UK
+COUNTRY_WEIGHTS = np.array([0.6] + [0.4 / (len(COUNTRIES) - 1)] * (len(COUNTRIES) - 1))
+
+START_DATE = np.datetime64('2010-01-01')
+END_DATE = np.datetime64('2011-12-31')
+
+# Pareto shape for customer order frequency; 1.16 gives roughly an 80/20 split
+PARETO_SHAPE = 1.16
+RETURN_RATE = 0.02
+CHUNK_INVOICES = 100_000
+
+
+def seasonal_day_weights(days):
+    """Relative order volume per day: a November peak and quieter weekends."""
+    day_of_year = (days - days.astype('datetime64[Y]')).astype(int)
+    # 1970-01-01 was a Thursday, so Monday == 0
+    weekday = (days.astype(int) + 3) % 7
+    weights = 1.0 + 1.5 * np.exp(-(((day_of_year - 320) / 35.0) ** 2))
+    weights *= np.select([weekday == 5, weekday == 6], [0.3, 0.6], 1.0)
+    return weights / weights.sum()
+
+
+def generate_order_chunks(num_customers=500, num_invoices=5000, max_lines=5,
+                          num_products=100, seed=42, chunk_invoices=CHUNK_INVOICES):
+    """Yield synthetic fact_orders DataFrames of at most ``chunk_invoices`` invoices each.
+    
+    Customer order frequency follows a Pareto distribution, invoice dates follow
+    a seasonal curve and each invoice has 1 to ``max_lines`` distinct products.
+    About 2% of lines are returns (negative quantity). The output depends only
+    on the arguments, so the same ``seed`` always produces the same rows.
+    """
+    if max_lines > num_products:
+        raise ValueError("max_lines cannot exceed num_products (stock codes are unique per invoice)")
+    if num_customers >= 10**9 or num_invoices > 10**9:
+        raise ValueError("customer and invoice numbers must fit in VARCHAR(10)")
+    
+    rng = np.random.default_rng(seed)
+    
+    customer_cdf = np.cumsum(rng.pareto(PARETO_SHAPE, num_customers) + 1)
+    customer_cdf /= customer_cdf[-1]
+    customer_ids = np.char.add(
+        'C', np.char.zfill(np.arange(1, num_customers + 1).astype(str), max(6, len(str(num_customers))))
+    ).astype(object)
+    customer_countries = np.array(COUNTRIES, dtype=object)[
+        rng.choice(len(COUNTRIES), size=num_customers, p=COUNTRY_WEIGHTS)
+    ]
+    
+    days = np.arange(START_DATE, END_DATE + 1)
+    day_cdf = np.cumsum(seasonal_day_weights(days))
+    
+    stock_codes = np.array([f'SKU{i:05d}' for i in range(1, num_products + 1)], dtype=object)
+    descriptions = np.array([f'Product {i}' for i in range(1, num_products + 1)], dtype=object)
+    product_prices = np.round(np.clip(rng.lognormal(1.0, 0.9, num_products), 0.1, 500.0), 2)
+    
+    invoice_prefix, invoice_width = ('INV', 7) if num_invoices <= 10**7 else ('I', 9)
+    
+    for start in range(0, num_invoices, chunk_invoices):
+        n = min(chunk_invoices, num_invoices - start)
+        
+        # Invoice level
+        customer_idx = np.minimum(np.searchsorted(customer_cdf, rng.random(n)), num_customers - 1)
+        day_idx = np.minimum(np.searchsorted(day_cdf, rng.random(n)), len(days) - 1)
+        seconds = rng.integers(8 * 3600, 18 * 3600, n).astype('timedelta64[s]')
+        invoice_dates = days[day_idx].astype('datetime64[s]') + seconds
+        invoice_nos = np.char.add(
+            invoice_prefix, np.char.zfill(np.arange(start, start + n).astype(str), invoice_width)
+        ).astype(object)
+        lines = rng.integers(1, max_lines + 1, n)
+        first_product = rng.integers(0, num_products, n)
+        
+        # Line level: consecutive product numbers keep stock codes unique within an invoice
+        line_invoice = np.repeat(np.arange(n), lines)
+        position = np.arange(len(line_invoice)) - np.repeat(np.cumsum(lines) - lines, lines)
+        product = (first_product[line_invoice] + position) % num_products
+        quantity = rng.geometric(0.15, len(line_invoice))
+        quantity = np.where(rng.random(len(line_invoice)) < RETURN_RATE, -quantity, quantity)
+        
+        yield pd.DataFrame({
+            'invoice_no': invoice_nos[line_invoice],
+            'invoice_date': invoice_dates[line_invoice],
+            'customer_id': customer_ids[customer_idx][line_invoice],
+            'country': customer_countries[customer_idx][line_invoice],
+            'stock_code': stock_codes[product],
+            'description': descriptions[product],
+            'quantity': quantity,
+            'unit_price': product_prices[product],
+        })
+
+
+def create_and_populate_fact_orders(num_customers=500, num_invoices=5000, max_lines=5,
+                                    num_products=100, seed=42, partitioned=False):
+    """Create fact_orders table and populate it with synthetic Online Retail II style data.
+    
+    Rows are generated in NumPy chunks and streamed into the table with COPY, so
+    memory use stays bounded regardless of ``num_invoices``. ``partitioned``
+    creates the table range-partitioned by invoice_date month.
+    """
     
     load_dotenv()
     db_url = os.getenv("SUPABASE_DB_URL")
@@ -24,93 +179,45 @@ def create_and_populate_fact_orders():
         print(f"❌ Failed to connect to database: {e}")
         return False
     
-    # Create fact_orders table
-    create_table_sql = """
-    DROP TABLE IF EXISTS fact_orders CASCADE;
-    
-    CREATE TABLE fact_orders (
-        invoice_no VARCHAR(10) NOT NULL,
-        invoice_date TIMESTAMP NOT NULL,
-        customer_id VARCHAR(10),
-        country VARCHAR(50),
-        stock_code VARCHAR(20),
-        description VARCHAR(100),
-        quantity INTEGER,
-        unit_price NUMERIC(10, 2),
-        PRIMARY KEY (invoice_no, stock_code, customer_id)
-    );
-    
-    CREATE INDEX idx_fact_orders_customer_id ON fact_orders(customer_id);
-    CREATE INDEX idx_fact_orders_invoice_date ON fact_orders(invoice_date);
-    """
-    
     try:
-        with engine.connect() as connection:
-            for statement in create_table_sql.split(';'):
-                if statement.strip():
-                    connection.execute(text(statement))
-                    connection.commit()
-        print("✅ Created fact_orders table")
+        run_statements(engine, CREATE_PARTITIONED_FACT_ORDERS_SQL if partitioned else CREATE_FACT_ORDERS_SQL)
+        print(f"✅ Created {'partitioned ' if partitioned else ''}fact_orders table")
     except Exception as e:
         print(f"❌ Error creating table: {e}")
         return False
     
-    # Generate sample data (Online Retail II style)
-    print("📊 Generating sample data...")
-    
-    countries = ['United Kingdom', 'Netherlands', 'EIRE', 'Germany', 'France', 'Sweden',
-                 'Switzerland', 'Spain', 'Poland', 'Italy', 'Belgium', 'Norway', 'Finland',
-                 'Cyprus', 'Japan', 'USA', 'Australia', 'Canada']
-    
-    stock_codes = [f'SKU{i:05d}' for i in range(1, 101)]
-    descriptions = [f'Product {i}' for i in range(1, 101)]
+    print(f"📊 Generating {num_invoices:,} invoices for {num_customers:,} customers (seed {seed})...")
     
-    records = []
-    start_date = datetime(2010, 1, 1)
-    end_date = datetime(2011, 12, 31)
+    stats = {'invoices': 0, 'countries': set()}
+    active_customers = np.zeros(num_customers + 1, dtype=bool)
     
-    num_customers = 500
-    num_invoices = 5000
+    def tracked(frames):
+        for frame in frames:
+            stats['invoices'] += frame['invoice_no'].nunique()
+            stats['countries'].update(frame['country'].unique())
+            active_customers[frame['customer_id'].str[1:].astype(int).to_numpy()] = True
+            yield frame
     
-    customer_ids = [f'C{i:06d}' for i in range(1, num_customers + 1)]
+    try:
+        started = time.perf_counter()
+        chunks = generate_order_chunks(num_customers, num_invoices, max_lines, num_products, seed)
+        rows = copy_into_fact_orders(engine, tracked(chunks), partitioned=partitioned)
+        load_seconds = time.perf_counter() - started
+        run_statements(engine, PARTITIONED_FACT_ORDERS_INDEXES_SQL if partitioned else FACT_ORDERS_INDEXES_SQL)
+        print(f"✅ Inserted {rows:,} order records into fact_orders "
+              f"({rows / max(load_seconds, 1e-9):,.0f} rows/sec)")
+        print(f"   - Customers: {int(active_customers.sum()):,}")
+        print(f"   - Invoices: {stats['invoices']:,}")
+        print(f"   - Countries: {len(stats['countries'])}")
+    except Exception as e:
+        print(f"❌ Error inserting data: {e}")
+        return False
     
-    for invoice_idx in range(num_invoices):
-        invoice_no = f'INV{invoice_idx:08d}'
-        invoice_date = start_date + timedelta(days=random.randint(0, (end_date - start_date).days))
-        customer_id = random.choice(customer_ids)
-        country = random.choice(countries)
-        
-        # 1-5 items per invoice
-        num_items = random.randint(1, 5)
-        for _ in range(num_items):
-            stock_code = random.choice(stock_codes)
-            description = f'Product {stock_codes.index(stock_code) + 1}'
-            quantity = random.randint(1, 20)
-            unit_price = round(random.uniform(1.0, 100.0), 2)
-            
-            records.append({
-                'invoice_no': invoice_no,
-                'invoice_date': invoice_date,
-                'customer_id': customer_id,
-                'country': country,
-                'stock_code': stock_code,
-                'description': description,
-                'quantity': quantity,
-                'unit_price': unit_price
-            })
-    
-    df = pd.DataFrame(records)
-    
-    # Insert data
     try:
-        df.to_sql('fact_orders', engine, if_exists='append', index=False)
-        print(f"✅ Inserted {len(df):,} order records into fact_orders")
-        print(f"   - Customers: {df['customer_id'].nunique():,}")
-        print(f"   - Invoices: {df['invoice_no'].nunique():,}")
-        print(f"   - Countries: {df['country'].nunique()}")
+        build_fact_invoices(engine)
         return True
     except Exception as e:
-        print(f"❌ Error inserting data: {e}")
+        print(f"❌ Error building fact_invoices: {e}")
         return False
 
 
@@ -130,14 +237,15 @@ def create_predictions_table():
         print(f"❌ Failed to connect to database: {e}")
         return False
     
+    # Emptied rather than dropped, so vw_customer_master (and refresh_aggregates.py) survive a reload
     create_predictions_sql = """
-    DROP TABLE IF EXISTS customer_predictions CASCADE;
-    
-    CREATE TABLE customer_predictions (
+    CREATE TABLE IF NOT EXISTS customer_predictions (
         customer_id VARCHAR(10) PRIMARY KEY,
         churn_prob NUMERIC(5, 4),
         clv NUMERIC(12, 2)
     );
+    
+    TRUNCATE customer_predictions;
     """
     
     try:
@@ -154,9 +262,26 @@ def create_predictions_table():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Populate fact_orders with synthetic sample data.")
+    parser.add_argument("--customers", type=int, default=500, help="Number of customers")
+    parser.add_argument("--invoices", type=int, default=5000, help="Number of invoices")
+    parser.add_argument("--max-lines", type=int, default=5, help="Maximum order lines per invoice")
+    parser.add_argument("--products", type=int, default=100, help="Number of distinct stock codes")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="Create fact_orders range-partitioned by invoice_date month")
+    args = parser.parse_args()
+    
     print("🚀 Setting up fact_orders table with sample data...\n")
     
-    success = create_and_populate_fact_orders()
+    success = create_and_populate_fact_orders(
+        num_customers=args.customers,
+        num_invoices=args.invoices,
+        max_lines=args.max_lines,
+        num_products=args.products,
+        seed=args.seed,
+        partitioned=args.partitioned,
+    )
     
     if success:
         create_predictions_table()
@@ -0,0 +1,439 @@
+"""Script to refresh the materialized aggregates behind the dashboard views."""
+import argparse
+import os
+import sys
+from datetime import date
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+
+# Per-customer aggregates written into customer_master_base, read from the invoice-level
+# fact_invoices table. {customer_filter} restricts the scan to the customers being recomputed.
+CUSTOMER_MASTER_REFRESH_SQL = """
+INSERT INTO customer_master_base (
+    customer_id,
+    country,
+    first_order_date,
+    last_order_date,
+    frequency_orders,
+    monetary_revenue,
+    total_return_revenue
+)
+WITH
+-- CONFIG: update base table and column names here if your schema differs.
+-- fact_invoices already holds one row per (invoice_no, customer_id).
+order_level AS (
+    SELECT
+        invoice_no,
+        invoice_date::date AS invoice_date,
+        customer_id,
+        country,
+        revenue AS order_revenue,
+        return_revenue,
+        line_count
+    FROM fact_invoices
+    WHERE {customer_filter}
+),
+customer_orders AS (
+    SELECT
+        customer_id,
+        MIN(invoice_date) AS first_order_date,
+        MAX(invoice_date) AS last_order_date,
+        COUNT(DISTINCT invoice_no) AS frequency_orders,
+        SUM(order_revenue) AS monetary_revenue,
+        SUM(return_revenue) AS total_return_revenue
+    FROM order_level
+    GROUP BY customer_id
+),
+country_ranked AS (
+    SELECT
+        customer_id,
+        country,
+        ROW_NUMBER() OVER (
+            PARTITION BY customer_id
+            ORDER BY SUM(line_count) DESC, country ASC
+        ) AS rn
+    FROM order_level
+    GROUP BY customer_id, country
+)
+SELECT
+    co.customer_id,
+    cr.country,
+    co.first_order_date,
+    co.last_order_date,
+    co.frequency_orders,
+    co.monetary_revenue,
+    co.total_return_revenue
+FROM customer_orders co
+LEFT JOIN country_ranked cr
+    ON co.customer_id = cr.customer_id
+    AND cr.rn = 1
+"""
+
+# Monthly metrics per (month, country, segment) written into monthly_rollup from fact_invoices.
+# {date_filter} restricts the scan to the months being recomputed.
+MONTHLY_ROLLUP_REFRESH_SQL = """
+INSERT INTO monthly_rollup (
+    month,
+    country,
+    segment,
+    active_customers,
+    orders,
+    revenue,
+    order_rows,
+    repeat_orders
+)
+WITH
+-- CONFIG: update base table and column names here if your schema differs.
+order_level AS (
+    SELECT
+        invoice_no,
+        customer_id,
+        DATE_TRUNC('month', invoice_date::date)::date AS month,
+        revenue AS order_revenue
+    FROM fact_invoices
+    WHERE {date_filter}
+),
+customer_monthly_orders AS (
+    SELECT
+        month,
+        customer_id,
+        COUNT(*) AS monthly_orders
+    FROM order_level
+    GROUP BY month, customer_id
+),
+enriched AS (
+    SELECT
+        ol.month,
+        ol.invoice_no,
+        ol.customer_id,
+        ol.order_revenue,
+        COALESCE(cm.country, 'Unknown') AS country,
+        COALESCE(cm.segment, 'Unknown') AS segment,
+        CASE WHEN cmo.monthly_orders > 1 THEN 1 ELSE 0 END AS is_repeat
+    FROM order_level ol
+    LEFT JOIN customer_monthly_orders cmo
+        ON ol.month = cmo.month
+        AND ol.customer_id = cmo.customer_id
+    LEFT JOIN vw_customer_master cm
+        ON ol.customer_id = cm.customer_id
+)
+SELECT
+    month,
+    CASE WHEN GROUPING(country) = 1 THEN 'All' ELSE country END AS country,
+    CASE WHEN GROUPING(segment) = 1 THEN 'All' ELSE segment END AS segment,
+    COUNT(DISTINCT customer_id) AS active_customers,
+    COUNT(DISTINCT invoice_no) AS orders,
+    SUM(order_revenue) AS revenue,
+    COUNT(*) AS order_rows,
+    SUM(is_repeat) AS repeat_orders
+FROM enriched
+GROUP BY GROUPING SETS (
+    (month),
+    (month, country),
+    (month, segment),
+    (month, country, segment)
+)
+"""
+
+# Earliest invoice of any customer whose country or segment differs from the one monthly_rollup
+# last sliced them under (new customers included). Segment depends on CURRENT_DATE, so
+# customers move between segments as time passes even when no orders arrive.
+RESLICE_FROM_SQL = """
+SELECT MIN(fi.invoice_date)
+FROM fact_invoices fi
+JOIN (
+    SELECT customer_id, country, segment FROM vw_customer_master
+    EXCEPT
+    SELECT customer_id, country, segment FROM monthly_rollup_customers
+) changed
+    ON fi.customer_id = changed.customer_id
+"""
+
+# Guest lines (NULL customer_id) are not a customer, so customer_master_base has no row for them.
+# The pre-materialized view grouped them into one NULL row; monthly_rollup still counts them
+# under the 'Unknown' segment.
+ALL_CUSTOMERS_FILTER = "customer_id IS NOT NULL"
+CHANGED_CUSTOMERS_FILTER = "customer_id IN (SELECT customer_id FROM changed_customers)"
+
+
+def get_watermark(connection, object_name):
+    """Return the stored fact_orders watermark for a materialized object."""
+    return connection.execute(
+        text("SELECT watermark FROM refresh_watermarks WHERE object_name = :object_name"),
+        {"object_name": object_name},
+    ).scalar()
+
+
+def get_load_watermark(connection, object_name):
+    """Return the last load_log id applied to a materialized object (0 if none)."""
+    return connection.execute(
+        text("SELECT COALESCE(load_id, 0) FROM refresh_watermarks WHERE object_name = :object_name"),
+        {"object_name": object_name},
+    ).scalar() or 0
+
+
+def latest_load_id(connection):
+    """Return the newest load_log id, or 0 when nothing has been logged."""
+    # information_schema rather than to_regclass, so the DuckDB backend can run this too
+    has_load_log = connection.execute(
+        text(
+            """
+            SELECT COUNT(*)
+            FROM information_schema.tables
+            WHERE table_schema = current_schema()
+              AND table_name = 'load_log'
+            """
+        )
+    ).scalar()
+    if not has_load_log:
+        return 0
+    return connection.execute(text("SELECT COALESCE(MAX(id), 0) FROM load_log")).scalar()
+
+
+def set_watermark(connection, object_name, watermark, load_id=None):
+    """Store the fact_orders watermark and load_log id reached by a refresh."""
+    connection.execute(
+        text(
+            """
+            INSERT INTO refresh_watermarks (object_name, watermark, load_id, refreshed_at)
+            VALUES (:object_name, :watermark, :load_id, NOW())
+            ON CONFLICT (object_name)
+            DO UPDATE SET
+                watermark = EXCLUDED.watermark,
+                load_id = EXCLUDED.load_id,
+                refreshed_at = EXCLUDED.refreshed_at
+            """
+        ),
+        {"object_name": object_name, "watermark": watermark, "load_id": load_id},
+    )
+
+
+def refresh_customer_master(connection, full=False):
+    """Recompute customer_master_base for customers with fact_orders rows past the watermark.
+
+    Customers touched by incremental loads logged since the last refresh are
+    recomputed too, even when the rewritten invoices are older than the watermark.
+    Returns the number of customers recomputed.
+    """
+    watermark = get_watermark(connection, "customer_master_base")
+    load_watermark = get_load_watermark(connection, "customer_master_base")
+    new_watermark = connection.execute(text("SELECT MAX(invoice_date) FROM fact_orders")).scalar()
+    new_load_id = latest_load_id(connection)
+
+    if new_watermark is None:
+        connection.execute(text("TRUNCATE customer_master_base"))
+        set_watermark(connection, "customer_master_base", None, new_load_id)
+        return 0
+
+    if full or watermark is None:
+        connection.execute(text("TRUNCATE customer_master_base"))
+        result = connection.execute(
+            text(CUSTOMER_MASTER_REFRESH_SQL.format(customer_filter=ALL_CUSTOMERS_FILTER))
+        )
+        set_watermark(connection, "customer_master_base", new_watermark, new_load_id)
+        return result.rowcount
+
+    if new_watermark <= watermark and new_load_id <= load_watermark:
+        return 0
+
+    loaded_customers = (
+        """
+            UNION
+            SELECT UNNEST(customer_ids)
+            FROM load_log
+            WHERE id > :load_watermark
+              AND id <= :new_load_id
+        """
+        if new_load_id > load_watermark
+        else ""
+    )
+    connection.execute(
+        text(
+            f"""
+            CREATE TEMP TABLE changed_customers ON COMMIT DROP AS
+            SELECT DISTINCT customer_id
+            FROM fact_orders
+            WHERE invoice_date > :watermark
+              AND customer_id IS NOT NULL
+            {loaded_customers}
+            """
+        ),
+        {"watermark": watermark, "load_watermark": load_watermark, "new_load_id": new_load_id},
+    )
+    connection.execute(
+        text(
+            """
+            DELETE FROM customer_master_base
+            WHERE customer_id IN (SELECT customer_id FROM changed_customers)
+            """
+        )
+    )
+    result = connection.execute(
+        text(CUSTOMER_MASTER_REFRESH_SQL.format(customer_filter=CHANGED_CUSTOMERS_FILTER))
+    )
+    set_watermark(connection, "customer_master_base", new_watermark, new_load_id)
+    return result.rowcount
+
+
+def record_rollup_customers(connection):
+    """Remember the country and segment every customer is sliced under in monthly_rollup."""
+    connection.execute(text("DELETE FROM monthly_rollup_customers"))
+    connection.execute(
+        text(
+            """
+            INSERT INTO monthly_rollup_customers (customer_id, country, segment)
+            SELECT customer_id, country, segment
+            FROM vw_customer_master
+            """
+        )
+    )
+
+
+def refresh_monthly_rollup(connection, full=False):
+    """Recompute monthly_rollup from the month of the stored watermark onwards.
+
+    Incremental loads logged since the last refresh move the start back to the
+    earliest invoice date they touched, and customers whose country or segment
+    changed since the last refresh move it back to their earliest invoice, so
+    every month slices each customer the same way. Returns the number of months
+    recomputed.
+    """
+    watermark = get_watermark(connection, "monthly_rollup")
+    load_watermark = get_load_watermark(connection, "monthly_rollup")
+    new_watermark = connection.execute(text("SELECT MAX(invoice_date) FROM fact_orders")).scalar()
+    new_load_id = latest_load_id(connection)
+
+    if new_watermark is None:
+        connection.execute(text("DELETE FROM monthly_rollup"))
+        record_rollup_customers(connection)
+        set_watermark(connection, "monthly_rollup", None, new_load_id)
+        return 0
+
+    full = full or watermark is None
+    resliced_from = None if full else connection.execute(text(RESLICE_FROM_SQL)).scalar()
+
+    if full:
+        from_month = None
+        connection.execute(text("DELETE FROM monthly_rollup"))
+        connection.execute(text(MONTHLY_ROLLUP_REFRESH_SQL.format(date_filter="TRUE")))
+    elif new_watermark <= watermark and new_load_id <= load_watermark and resliced_from is None:
+        return 0
+    else:
+        # The watermark month may have been partial, so it is rebuilt along with newer months
+        earliest = min(watermark, resliced_from or watermark)
+        if new_load_id > load_watermark:
+            loaded_from = connection.execute(
+                text(
+                    """
+                    SELECT MIN(min_invoice_date)
+                    FROM load_log
+                    WHERE id > :load_watermark
+                      AND id <= :new_load_id
+                    """
+                ),
+                {"load_watermark": load_watermark, "new_load_id": new_load_id},
+            ).scalar()
+            earliest = min(earliest, loaded_from or earliest)
+        from_month = date(earliest.year, earliest.month, 1)
+        connection.execute(
+            text("DELETE FROM monthly_rollup WHERE month >= :from_month"),
+            {"from_month": from_month},
+        )
+        connection.execute(
+            text(MONTHLY_ROLLUP_REFRESH_SQL.format(date_filter="invoice_date >= :from_month")),
+            {"from_month": from_month},
+        )
+
+    record_rollup_customers(connection)
+    set_watermark(connection, "monthly_rollup", new_watermark, new_load_id)
+    return connection.execute(
+        text(
+            """
+            SELECT COUNT(*)
+            FROM monthly_rollup
+            WHERE country = 'All'
+              AND segment = 'All'
+              AND (CAST(:from_month AS DATE) IS NULL OR month >= :from_month)
+            """
+        ),
+        {"from_month": from_month},
+    ).scalar()
+
+
+def refresh_filter_dimensions(connection):
+    """Rebuild the sidebar filter metadata from the customer master.
+
+    Segments are not stored: they depend on CURRENT_DATE, so app/filters.py reads
+    them from vw_customer_master.
+    """
+    connection.execute(text("DELETE FROM filter_dimensions"))
+    connection.execute(
+        text(
+            """
+            INSERT INTO filter_dimensions (dimension, value, min_date, max_date)
+            SELECT 'last_order_date', NULL::text, MIN(last_order_date), MAX(last_order_date)
+            FROM customer_master_base
+            UNION ALL
+            SELECT DISTINCT 'country', country, NULL::date, NULL::date
+            FROM customer_master_base
+            WHERE country IS NOT NULL
+            """
+        )
+    )
+
+
+def refresh_all(connection, full=False):
+    """Run every refresh step in dependency order.
+
+    Returns the number of customers and months recomputed.
+    """
+    customers = refresh_customer_master(connection, full=full)
+    refresh_filter_dimensions(connection)
+    months = refresh_monthly_rollup(connection, full=full)
+    return customers, months
+
+
+def refresh_aggregates(full=False):
+    """Refresh all materialized aggregates in a single transaction."""
+
+    load_dotenv()
+    db_url = os.getenv("SUPABASE_DB_URL")
+
+    if not db_url:
+        print("❌ Error: SUPABASE_DB_URL is not set. Add it to your .env file.")
+        return False
+
+    try:
+        engine = create_engine(db_url, pool_pre_ping=True)
+    except Exception as e:
+        print(f"❌ Failed to connect to database: {e}")
+        return False
+
+    try:
+        with engine.begin() as connection:
+            customers, months = refresh_all(connection, full=full)
+        print(f"✅ Refreshed customer_master_base: {customers:,} customers recomputed")
+        print("✅ Refreshed filter_dimensions")
+        print(f"✅ Refreshed monthly_rollup: {months:,} months recomputed")
+        return True
+    except Exception as e:
+        print(f"❌ Error refreshing aggregates: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Recompute every customer instead of only those past the watermark.",
+    )
+    args = parser.parse_args()
+
+    print("🚀 Refreshing materialized aggregates...\n")
+
+    if not refresh_aggregates(full=args.full):
+        print("\n❌ Refresh failed. Please check the errors above.")
+        sys.exit(1)
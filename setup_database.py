@@ -1,31 +1,178 @@
-"""Script to run SQL setup files in order."""
+"""Script to apply the SQL setup files as checksummed migrations."""
+import argparse
+import hashlib
 import os
+import re
 import sys
 from pathlib import Path
 
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
 
+from load_online_retail_data import build_fact_invoices
+from refresh_aggregates import refresh_aggregates
 
-def setup_database():
-    """Run all SQL setup files in order."""
+# SQL files to run in order
+SQL_FILES = [
+    "sql/01_vw_customer_master.sql",
+    "sql/02_vw_segment_kpis.sql",
+    "sql/03_vw_monthly_metrics.sql",
+    "sql/04_vw_top_at_risk.sql",
+    "sql/05_optional_predictions_table.sql",
+    "sql/06_filter_dimensions.sql",
+    "sql/07_monthly_rollup.sql",
+]
+
+SCHEMA_MIGRATIONS_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    filename TEXT PRIMARY KEY,
+    checksum TEXT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+)
+"""
+
+RECORD_MIGRATION_SQL = """
+INSERT INTO schema_migrations (filename, checksum, applied_at)
+VALUES (:filename, :checksum, NOW())
+ON CONFLICT (filename)
+DO UPDATE SET checksum = EXCLUDED.checksum, applied_at = EXCLUDED.applied_at
+"""
+
+CREATED_OBJECT_PATTERN = re.compile(
+    r"\bCREATE\s+(?:OR\s+REPLACE\s+)?(?:UNIQUE\s+)?(?:MATERIALIZED\s+)?"
+    r"(?:TABLE|VIEW|INDEX)\s+(?:IF\s+NOT\s+EXISTS\s+)?([\w.]+)",
+    re.IGNORECASE,
+)
+
+
+def strip_sql_comments(sql):
+    """Drop -- comments so object names mentioned in prose are not treated as references."""
+    return "\n".join(line.split("--", 1)[0] for line in sql.splitlines())
+
+
+def file_checksum(sql):
+    return hashlib.sha256(sql.encode()).hexdigest()
+
+
+def created_objects(sql):
+    """Return the tables, views and indexes a SQL file creates."""
+    return [name.lower() for name in CREATED_OBJECT_PATTERN.findall(strip_sql_comments(sql))]
+
+
+def load_migrations(sql_files=SQL_FILES):
+    """Read each SQL file with its checksum, the objects it creates and the files it depends on."""
+    migrations = []
+    for sql_file in sql_files:
+        file_path = Path(sql_file)
+        if not file_path.exists():
+            print(f"⚠️  Skipping {sql_file} (file not found)")
+            continue
+
+        sql = file_path.read_text()
+        body = strip_sql_comments(sql).lower()
+        objects = created_objects(sql)
+        # A file depends on every earlier file whose objects it references
+        depends_on = {
+            earlier["filename"]
+            for earlier in migrations
+            if any(
+                re.search(rf"\b{re.escape(name)}\b", body) and name not in objects
+                for name in earlier["objects"]
+            )
+        }
+        migrations.append(
+            {
+                "filename": sql_file,
+                "sql": sql,
+                "checksum": file_checksum(sql),
+                "objects": objects,
+                "depends_on": depends_on,
+            }
+        )
+    return migrations
+
+
+def missing_objects(connection, objects):
+    return [
+        name
+        for name in objects
+        if connection.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None
+    ]
+
+
+def plan_migrations(connection, migrations, force=False):
+    """Return the migrations to apply, in file order, and why each one is needed.
+
+    A file is applied when it is new, its checksum changed or any object it
+    creates is missing (e.g. a loader dropped fact_orders with CASCADE). Files
+    that depend on an applied file are reapplied too, because a file may drop
+    and recreate views that later files build on.
+    """
+    applied = dict(
+        connection.execute(text("SELECT filename, checksum FROM schema_migrations")).fetchall()
+    )
+    plan = []
+    planned = set()
+    for migration in migrations:
+        filename = migration["filename"]
+        if force:
+            reason = "forced"
+        elif filename not in applied:
+            reason = "new"
+        elif applied[filename] != migration["checksum"]:
+            reason = "changed"
+        elif migration["depends_on"] & planned:
+            reason = "depends on " + ", ".join(sorted(migration["depends_on"] & planned))
+        else:
+            missing = missing_objects(connection, migration["objects"])
+            reason = f"missing {', '.join(missing)}" if missing else None
+
+        if reason:
+            plan.append((migration, reason))
+            planned.add(filename)
+    return plan
+
+
+def apply_migrations(engine, migrations, force=False, dry_run=False):
+    """Apply the planned migrations in one transaction. Returns the number applied.
+
+    Each file runs as a single multi-statement batch, so comments and
+    semicolons need no splitting. Any error rolls back every file.
+    """
+    with engine.begin() as connection:
+        connection.execute(text(SCHEMA_MIGRATIONS_SQL))
+        # Serialize concurrent deploys against the same database
+        connection.execute(text("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))"))
+        plan = plan_migrations(connection, migrations, force=force)
+
+        for migration, reason in plan:
+            print(f"{'🔍 Would apply' if dry_run else '▶️  Applying'} {migration['filename']} ({reason})")
+            if dry_run:
+                continue
+            connection.exec_driver_sql(migration["sql"])
+            connection.execute(
+                text(RECORD_MIGRATION_SQL),
+                {"filename": migration["filename"], "checksum": migration["checksum"]},
+            )
+
+        if not dry_run:
+            all_objects = [name for migration in migrations for name in migration["objects"]]
+            missing = missing_objects(connection, all_objects)
+            if missing:
+                raise RuntimeError(f"Objects missing after migration: {', '.join(missing)}")
+    return len(plan)
+
+
+def setup_database(force=False, dry_run=False):
+    """Apply new or changed SQL setup files, then refresh the aggregates."""
     # Load environment variables
     load_dotenv()
     db_url = os.getenv("SUPABASE_DB_URL")
-    
+
     if not db_url:
         print("❌ Error: SUPABASE_DB_URL is not set. Add it to your .env file.")
         sys.exit(1)
-    
-    # SQL files to run in order
-    sql_files = [
-        "sql/01_vw_customer_master.sql",
-        "sql/02_vw_segment_kpis.sql",
-        "sql/03_vw_monthly_metrics.sql",
-        "sql/04_vw_top_at_risk.sql",
-        "sql/05_optional_predictions_table.sql",
-    ]
-    
+
     # Create database engine
     try:
         engine = create_engine(db_url, pool_pre_ping=True)
@@ -33,37 +180,54 @@ def setup_database():
     except Exception as e:
         print(f"❌ Failed to connect to database: {e}")
         sys.exit(1)
-    
-    # Execute each SQL file
-    for sql_file in sql_files:
-        file_path = Path(sql_file)
-        
-        if not file_path.exists():
-            print(f"⚠️  Skipping {sql_file} (file not found)")
-            continue
-        
-        try:
-            with open(file_path, "r") as f:
-                sql_content = f.read()
-            
-            # Split by semicolon to handle multiple statements
-            statements = [s.strip() for s in sql_content.split(";") if s.strip()]
-            
-            with engine.connect() as connection:
-                for statement in statements:
-                    if statement:
-                        connection.execute(text(statement))
-                        connection.commit()
-            
-            print(f"✅ Successfully executed {sql_file}")
-        
-        except Exception as e:
-            print(f"❌ Error executing {sql_file}: {e}")
-            # Continue with next file instead of exiting
-            continue
-    
+
+    # Databases loaded before fact_invoices existed get it built once from fact_orders
+    if not dry_run:
+        with engine.connect() as connection:
+            needs_invoices = not missing_objects(connection, ["fact_orders"]) and missing_objects(
+                connection, ["fact_invoices"]
+            )
+        if needs_invoices:
+            try:
+                build_fact_invoices(engine)
+            except Exception as e:
+                print(f"❌ Error building fact_invoices: {e}")
+                return False
+
+    migrations = load_migrations()
+    try:
+        applied = apply_migrations(engine, migrations, force=force, dry_run=dry_run)
+    except Exception as e:
+        print(f"❌ Migration failed, nothing was applied: {e}")
+        return False
+
+    if dry_run:
+        print(f"\n🔍 {applied} of {len(migrations)} SQL files would be applied")
+        return True
+    print(f"✅ Applied {applied} of {len(migrations)} SQL files ({len(migrations) - applied} unchanged)")
+
+    # Populate materialized tables read by the views (incremental after the first run)
+    if not refresh_aggregates():
+        print("❌ Database setup failed while refreshing the aggregates")
+        return False
+
     print("\n🎉 Database setup complete!")
+    return True
 
 
 if __name__ == "__main__":
-    setup_database()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Reapply every SQL file even if its checksum is unchanged",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print which SQL files would be applied without changing the database",
+    )
+    args = parser.parse_args()
+
+    if not setup_database(force=args.force, dry_run=args.dry_run):
+        sys.exit(1)
@@ -1,5 +1,8 @@
 -- View: vw_customer_master
 -- One row per customer with RFM-style metrics and optional churn/CLV predictions.
+-- Reads the materialized customer_master_base table, which is maintained by
+-- refresh_aggregates.py (only customers with new fact_orders rows are recomputed).
+-- Guest orders (NULL customer_id) have no row here. Monthly metrics still include them.
 
 -- Ensure optional predictions table exists (safe if already created).
 CREATE TABLE IF NOT EXISTS customer_predictions (
@@ -8,84 +11,67 @@ CREATE TABLE IF NOT EXISTS customer_predictions (
     clv NUMERIC
 );
 
-CREATE OR REPLACE VIEW vw_customer_master AS
-WITH
--- CONFIG: update base table and column names here if your schema differs.
-config AS (
-    SELECT
-        invoice_no,
-        invoice_date::date AS invoice_date,
-        customer_id,
-        country,
-        stock_code,
-        description,
-        quantity,
-        unit_price
-    FROM fact_orders
-),
-order_level AS (
-    SELECT
-        invoice_no,
-        customer_id,
-        MIN(invoice_date) AS invoice_date,
-        SUM(quantity * unit_price) AS order_revenue,
-        SUM(CASE WHEN quantity < 0 THEN quantity * unit_price ELSE 0 END) AS return_revenue
-    FROM config
-    GROUP BY invoice_no, customer_id
-),
-customer_orders AS (
-    SELECT
-        customer_id,
-        MIN(invoice_date) AS first_order_date,
-        MAX(invoice_date) AS last_order_date,
-        COUNT(DISTINCT invoice_no) AS frequency_orders,
-        SUM(order_revenue) AS monetary_revenue,
-        SUM(return_revenue) AS total_return_revenue
-    FROM order_level
-    GROUP BY customer_id
-),
-country_ranked AS (
-    SELECT
-        customer_id,
-        country,
-        COUNT(*) AS country_orders,
-        ROW_NUMBER() OVER (
-            PARTITION BY customer_id
-            ORDER BY COUNT(*) DESC, country ASC
-        ) AS rn
-    FROM config
-    GROUP BY customer_id, country
-)
+-- Materialized per-customer aggregates (populated by refresh_aggregates.py).
+CREATE TABLE IF NOT EXISTS customer_master_base (
+    customer_id TEXT PRIMARY KEY,
+    country TEXT,
+    first_order_date DATE,
+    last_order_date DATE,
+    frequency_orders BIGINT,
+    monetary_revenue NUMERIC,
+    total_return_revenue NUMERIC,
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_customer_master_base_last_order_date
+    ON customer_master_base(last_order_date);
+
+-- Keyset pagination order used by the Customer Drilldown browser.
+CREATE INDEX IF NOT EXISTS idx_customer_master_base_revenue
+    ON customer_master_base(monetary_revenue DESC, customer_id DESC);
+
+-- High-water mark of fact_orders.invoice_date per materialized object, plus the
+-- last load_log id applied (incremental loads can rewrite older invoices).
+CREATE TABLE IF NOT EXISTS refresh_watermarks (
+    object_name TEXT PRIMARY KEY,
+    watermark TIMESTAMP,
+    load_id INTEGER,
+    refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE refresh_watermarks ADD COLUMN IF NOT EXISTS load_id INTEGER;
+
+-- Recency and segment depend on CURRENT_DATE, so they are derived at read time.
+DROP VIEW IF EXISTS vw_customer_master CASCADE;
+
+CREATE VIEW vw_customer_master AS
 SELECT
-    co.customer_id,
-    cr.country,
-    co.first_order_date,
-    co.last_order_date,
-    (CURRENT_DATE - co.last_order_date) AS recency_days,
-    co.frequency_orders,
-    co.monetary_revenue,
+    cm.customer_id,
+    cm.country,
+    cm.first_order_date,
+    cm.last_order_date,
+    (CURRENT_DATE - cm.last_order_date) AS recency_days,
+    cm.frequency_orders,
+    cm.monetary_revenue,
     CASE
-        WHEN co.frequency_orders = 0 THEN NULL
-        ELSE co.monetary_revenue / co.frequency_orders
+        WHEN cm.frequency_orders = 0 THEN NULL
+        ELSE cm.monetary_revenue / cm.frequency_orders
     END AS avg_order_value,
     CASE
-        WHEN co.monetary_revenue = 0 THEN NULL
-        ELSE ABS(co.total_return_revenue) / NULLIF(co.monetary_revenue, 0)
+        WHEN cm.monetary_revenue = 0 THEN NULL
+        ELSE ABS(cm.total_return_revenue) / NULLIF(cm.monetary_revenue, 0)
     END AS return_rate,
     CASE
-        WHEN co.monetary_revenue >= 1000 AND (CURRENT_DATE - co.last_order_date) <= 60
+        WHEN cm.monetary_revenue >= 1000 AND (CURRENT_DATE - cm.last_order_date) <= 60
             THEN 'High Value Active'
-        WHEN co.monetary_revenue >= 1000 AND (CURRENT_DATE - co.last_order_date) > 60
+        WHEN cm.monetary_revenue >= 1000 AND (CURRENT_DATE - cm.last_order_date) > 60
             THEN 'High Value At Risk'
-        WHEN co.monetary_revenue < 1000 AND (CURRENT_DATE - co.last_order_date) <= 60
+        WHEN cm.monetary_revenue < 1000 AND (CURRENT_DATE - cm.last_order_date) <= 60
             THEN 'Active'
         ELSE 'Dormant'
     END AS segment,
     cp.churn_prob,
     cp.clv
-FROM customer_orders co
-LEFT JOIN country_ranked cr
-    ON co.customer_id = cr.customer_id
-    AND cr.rn = 1
+FROM customer_master_base cm
 LEFT JOIN customer_predictions cp
-    ON co.customer_id = cp.customer_id;
+    ON cm.customer_id = cp.customer_id;
@@ -4,26 +4,14 @@
 CREATE OR REPLACE VIEW vw_monthly_metrics AS
 WITH
 -- CONFIG: update base table and column names here if your schema differs.
-config AS (
-    SELECT
-        invoice_no,
-        invoice_date::date AS invoice_date,
-        customer_id,
-        country,
-        stock_code,
-        description,
-        quantity,
-        unit_price
-    FROM fact_orders
-),
+-- fact_invoices holds one row per (invoice_no, customer_id), maintained by the loaders.
 order_level AS (
     SELECT
         invoice_no,
         customer_id,
-        DATE_TRUNC('month', MIN(invoice_date))::date AS month,
-        SUM(quantity * unit_price) AS order_revenue
-    FROM config
-    GROUP BY invoice_no, customer_id
+        DATE_TRUNC('month', invoice_date::date)::date AS month,
+        revenue AS order_revenue
+    FROM fact_invoices
 ),
 customer_monthly_orders AS (
     SELECT
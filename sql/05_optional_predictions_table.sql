@@ -7,6 +7,10 @@ CREATE TABLE IF NOT EXISTS customer_predictions (
     clv NUMERIC
 );
 
+-- Top-K priority lists (ORDER BY churn_prob * clv DESC LIMIT k) read this index.
+CREATE INDEX IF NOT EXISTS idx_customer_predictions_priority
+    ON customer_predictions ((churn_prob * clv) DESC);
+
 -- Example inserts (replace with your predictions):
 -- INSERT INTO customer_predictions (customer_id, churn_prob, clv)
 -- VALUES
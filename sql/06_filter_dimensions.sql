@@ -0,0 +1,11 @@
+-- Table: filter_dimensions
+-- Sidebar filter metadata (last order date bounds, countries) in one small table.
+-- Segments depend on CURRENT_DATE, so the sidebar reads them from vw_customer_master.
+-- Rebuilt by refresh_aggregates.py whenever the customer master is refreshed.
+
+CREATE TABLE IF NOT EXISTS filter_dimensions (
+    dimension TEXT NOT NULL,
+    value TEXT,
+    min_date DATE,
+    max_date DATE
+);
@@ -0,0 +1,26 @@
+-- Table: monthly_rollup
+-- Monthly active customers, orders, revenue and repeat orders pre-aggregated with
+-- GROUPING SETS over (month), (month, country), (month, segment) and
+-- (month, country, segment). Rolled-up dimensions hold 'All'.
+-- Maintained by refresh_aggregates.py, which recomputes months from the stored watermark
+-- onwards, plus every month of customers whose country or segment has changed since.
+
+CREATE TABLE IF NOT EXISTS monthly_rollup (
+    month DATE NOT NULL,
+    country TEXT NOT NULL,
+    segment TEXT NOT NULL,
+    active_customers BIGINT,
+    orders BIGINT,
+    revenue NUMERIC,
+    order_rows BIGINT,
+    repeat_orders BIGINT,
+    PRIMARY KEY (month, country, segment)
+);
+
+-- Country and segment each customer is sliced under in monthly_rollup. The refresh compares
+-- it with vw_customer_master to find customers whose older months must be re-sliced.
+CREATE TABLE IF NOT EXISTS monthly_rollup_customers (
+    customer_id TEXT PRIMARY KEY,
+    country TEXT,
+    segment TEXT
+);